@@ -5,34 +5,33 @@ from __future__ import annotations
 
 import argparse
 import base64
+import functools
+import hashlib
 import os
 import re
 import sys
-import textwrap
 import json
 import difflib
-from datetime import datetime, timezone
+import math
+import sqlite3
+from array import array
 import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
 from pathlib import Path
-from time import perf_counter
-from typing import Any, Iterator
+from time import gmtime, perf_counter, strftime, time, time_ns
+from types import SimpleNamespace
+from typing import Any, Callable, Iterable, Iterator
 from urllib.parse import urlparse
 
-try:  # pragma: no cover - optional dependency resolution
-    from openai import AzureOpenAI
-except ModuleNotFoundError:  # pragma: no cover - helpful message at runtime
-    AzureOpenAI = None  # type: ignore
+# openai, httpx, dotenv, tiktoken and the validator are imported where they are
+# used, so `--help` and argument errors don't pay for loading the SDK.
 
-try:  # pragma: no cover - optional import for in-process validation
-    from validate_generated_output import append_validation_run, validate_file
-except Exception:  # pragma: no cover
-    append_validation_run = None  # type: ignore
-    validate_file = None  # type: ignore
-
-try:  # pragma: no cover
-    from dotenv import load_dotenv
+try:  # pragma: no cover - optional, faster JSON encode/decode
+    import orjson
 except ModuleNotFoundError:  # pragma: no cover
-    load_dotenv = None  # type: ignore
+    orjson = None  # type: ignore
 
 DEFAULT_SYSTEM_PROMPT = (
     "You are an assistant that uses SuiteCRM project context to craft precise, production-ready code. "
@@ -61,7 +60,12 @@ FILE_BUNDLE_INSTRUCTIONS = (
 APPROACH_RAW = "raw"
 OUTPUT_MODE_TEXT = "text"
 OUTPUT_MODE_MODULE = "module"
-SUPPORTED_EXTENSIONS = (".php", ".js", ".ts", ".tpl")
+SUPPORTED_EXTENSIONS = frozenset({".php", ".js", ".ts", ".tpl"})
+# Same suffixes as a tuple for str.endswith, which checks them all in C.
+_SUPPORTED_SUFFIXES = tuple(SUPPORTED_EXTENSIONS)
+# Third-party, VCS and runtime-data directories pruned while walking a source
+# directory (a directory passed explicitly is still walked).
+EXCLUDED_DIR_NAMES = frozenset({".git", "node_modules", "vendor", "cache", "upload"})
 
 DEFAULT_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
 
@@ -73,20 +77,38 @@ def _dotenv_candidates() -> list[Path]:
     ]
 
 
+# KEY=value, KEY="value" or KEY='value', with an optional trailing # comment. In an
+# unquoted value '#' only starts a comment after whitespace, so KEY=abc#def keeps abc#def.
+_ENV_LINE_RE = re.compile(
+    r"""^\s*([A-Za-z_][A-Za-z0-9_]*)\s*=\s*"""
+    r"""(?:"([^"]*)"\s*(?:#.*)?|'([^']*)'\s*(?:#.*)?|((?:\S(?:.*?\S)??)?)(?:\s+#.*)?\s*)$"""
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_dotenv_file(env_path: Path) -> dict[str, str]:
+    """Parse a .env file once; later lookups reuse the cached mapping.
+
+    The first assignment of a key wins, matching the line-by-line lookups this
+    replaces.
+    """
+
+    values: dict[str, str] = {}
+    if not env_path.exists() or not env_path.is_file():
+        return values
+    for line in env_path.read_text(encoding="utf-8", errors="replace").splitlines():
+        m = _ENV_LINE_RE.match(line)
+        if m:
+            key, double, single, bare = m.groups()
+            values.setdefault(key, double if double is not None else single if single is not None else bare)
+    return values
+
+
 def _read_dotenv_value(key: str) -> str | None:
     for env_path in _dotenv_candidates():
-        if not env_path.exists() or not env_path.is_file():
-            continue
-        for raw_line in env_path.read_text(encoding="utf-8", errors="replace").splitlines():
-            line = raw_line.strip()
-            if not line or line.startswith("#") or "=" not in line:
-                continue
-            k, v = line.split("=", 1)
-            k = k.strip()
-            if k != key:
-                continue
-            value = v.strip().strip('"').strip("'")
-            return value if value else None
+        values = _load_dotenv_file(env_path)
+        if key in values:
+            return values[key] or None
     return None
 
 
@@ -136,16 +158,8 @@ def load_dotenv_fallback() -> None:
     for env_path in candidates:
         if not env_path.exists() or not env_path.is_file():
             continue
-        for raw_line in env_path.read_text(encoding="utf-8", errors="replace").splitlines():
-            line = raw_line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" not in line:
-                continue
-            key, value = line.split("=", 1)
-            key = key.strip()
-            value = value.strip().strip('"').strip("'")
-            if key and key not in os.environ:
+        for key, value in _load_dotenv_file(env_path).items():
+            if key not in os.environ:
                 os.environ[key] = value
         return
 
@@ -175,27 +189,51 @@ def normalize_azure_endpoint(raw: str) -> str:
     return raw
 
 
+def create_http_client(timeout: float = 600.0, max_connections: int = 10) -> Any | None:
+    """Return one keep-alive httpx client to hand to AzureOpenAI, or None.
+
+    All requests of a run (generation, bundle repair, per-module summaries)
+    go through this client, so they share pooled TLS connections. HTTP/2 is
+    enabled when the optional `h2` package is installed. `timeout` bounds each
+    read, so a stalled (streaming) response fails over to the SDK's retries.
+    Callers that run requests concurrently should size `max_connections` to
+    their concurrency, so no call waits on the pool for a free connection.
+    """
+
+    try:  # pragma: no cover - installed alongside openai
+        import httpx
+    except ModuleNotFoundError:  # pragma: no cover
+        return None
+    try:
+        import h2  # noqa: F401
+
+        http2 = True
+    except ModuleNotFoundError:
+        http2 = False
+    return httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(max_keepalive_connections=max_connections, max_connections=max_connections),
+        # Same connect timeout as the openai SDK default client.
+        timeout=httpx.Timeout(timeout, connect=5.0),
+    )
+
+
+_OPEN_FENCE_RE = re.compile(r"`{3,}[^\n]*")
+_CLOSE_FENCE_RE = re.compile(r"`{3,}\s*\Z")
+
+
 def strip_markdown_fences(text: str) -> str:
     stripped = (text or "").strip()
-    if not stripped:
-        return ""
+    if not stripped.startswith("```"):
+        # Common case (no fence): skip scanning the completion at all.
+        return stripped
 
     # Handle fenced blocks like ```diff ... ``` or even ````diff ... ````.
-    fence_re = re.compile(r"^`{3,}.*$")
-    end_fence_re = re.compile(r"^`{3,}\s*$")
-
-    lines = stripped.splitlines()
-    if lines and fence_re.match(lines[0].strip()):
-        lines = lines[1:]
-        while lines and lines[0].strip() == "":
-            lines = lines[1:]
-        if lines and end_fence_re.match(lines[-1].strip()):
-            lines = lines[:-1]
-        while lines and lines[-1].strip() == "":
-            lines = lines[:-1]
-        return "\n".join(lines).strip()
-
-    return stripped
+    body = stripped[_OPEN_FENCE_RE.match(stripped).end():].strip()
+    last_nl = body.rfind("\n")
+    if _CLOSE_FENCE_RE.match(body[last_nl + 1:].strip()):
+        body = body[:max(last_nl, 0)]
+    return body.strip()
 
 
 def looks_like_unified_diff(text: str) -> bool:
@@ -366,6 +404,9 @@ def build_patch_from_function_output(
 
 
 _HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_HUNK_BOUNDARY_PREFIXES = ("@@", "diff --git ", "--- ", "+++ ")
+# (old, new) line-count increments keyed by the first character of a hunk body line.
+_HUNK_LINE_COUNTS = {" ": (1, 1), "-": (1, 0), "+": (0, 1)}
 
 
 def normalize_unified_diff_hunk_counts(text: str) -> str:
@@ -379,14 +420,24 @@ def normalize_unified_diff_hunk_counts(text: str) -> str:
     if not text or "@@" not in text:
         return text
 
+    return "\n".join(iter_hunk_count_normalized_lines(text))
+
+
+def iter_hunk_count_normalized_lines(text: str) -> Iterator[str]:
+    """Yield the lines of `normalize_unified_diff_hunk_counts(text)` one by one.
+
+    Lets a caller write the recounted diff straight to a file instead of
+    building the joined string first.
+    """
+
     lines = text.splitlines()
-    out: list[str] = []
     i = 0
     while i < len(lines):
         line = lines[i]
-        m = _HUNK_HEADER_RE.match(line)
+        # Only hunk headers can match; skip the regex for every other line.
+        m = _HUNK_HEADER_RE.match(line) if line.startswith("@@ -") else None
         if not m:
-            out.append(line)
+            yield line
             i += 1
             continue
 
@@ -399,31 +450,26 @@ def normalize_unified_diff_hunk_counts(text: str) -> str:
         j = i + 1
         while j < len(lines):
             body = lines[j]
-            if body.startswith("@@") or body.startswith("diff --git ") or body.startswith("--- ") or body.startswith("+++ "):
+            if body.startswith(_HUNK_BOUNDARY_PREFIXES):
                 break
-            if body.startswith("\\"):
+            lead = body[:1]
+            if lead == "\\":
                 j += 1
                 continue
-            if body.startswith(" "):
-                old_count += 1
-                new_count += 1
-            elif body.startswith("-"):
-                old_count += 1
-            elif body.startswith("+"):
-                new_count += 1
-            else:
+            counts = _HUNK_LINE_COUNTS.get(lead)
+            if counts is None:
                 # Not a valid hunk line; leave as-is.
                 break
+            old_count += counts[0]
+            new_count += counts[1]
             j += 1
 
-        out.append(f"@@ -{old_start},{old_count} +{new_start},{new_count} @@")
+        yield f"@@ -{old_start},{old_count} +{new_start},{new_count} @@"
         i += 1
         while i < j:
-            out.append(lines[i])
+            yield lines[i]
             i += 1
 
-    return "\n".join(out)
-
 
 def normalize_unified_diff_hunk_blank_lines(text: str) -> str:
     """Replace empty lines inside hunks with a single-space context line.
@@ -459,6 +505,62 @@ def normalize_unified_diff_hunk_blank_lines(text: str) -> str:
     return "\n".join(out)
 
 
+def iter_normalized_unified_diff_lines(text: str) -> Iterator[str]:
+    """Yield diff lines with blank hunk lines and hunk counts fixed.
+
+    Equivalent to `normalize_unified_diff_hunk_blank_lines` followed by
+    `normalize_unified_diff_hunk_counts`, but lines outside hunks are yielded
+    as soon as they are seen and only the hunk being counted is buffered, so
+    the result can be written straight to a file.
+    """
+
+    header: re.Match[str] | None = None
+    body: list[str] = []
+    old_count = 0
+    new_count = 0
+    in_hunk = False
+
+    def flush() -> Iterator[str]:
+        yield f"@@ -{header.group(1)},{old_count} +{header.group(3)},{new_count} @@"
+        yield from body
+
+    for line in text.splitlines():
+        if line.startswith(_HUNK_BOUNDARY_PREFIXES):
+            if header is not None:
+                yield from flush()
+                header = None
+            in_hunk = line.startswith("@@")
+            header = _HUNK_HEADER_RE.match(line) if line.startswith("@@ -") else None
+            if header is None:
+                yield line
+            else:
+                body, old_count, new_count = [], 0, 0
+            continue
+
+        if in_hunk and line == "":
+            line = " "
+
+        if header is None:
+            yield line
+            continue
+
+        lead = line[:1]
+        counts = _HUNK_LINE_COUNTS.get(lead)
+        if counts is not None:
+            old_count += counts[0]
+            new_count += counts[1]
+        elif lead != "\\":
+            # Not a valid hunk line; the hunk ends here and the line is left as-is.
+            yield from flush()
+            header = None
+            yield line
+            continue
+        body.append(line)
+
+    if header is not None:
+        yield from flush()
+
+
 def accepted_prediction_tokens_from_usage(usage: Any) -> int | None:
     try:
         completion_details = getattr(usage, "completion_tokens_details", None) if usage else None
@@ -469,41 +571,112 @@ def accepted_prediction_tokens_from_usage(usage: Any) -> int | None:
         return None
 
 
-def run_chat_completion(
+def run_chat_completion_choices(
     client: Any,
     deployment: str,
     messages: list[Any],
     temperature: float,
     max_tokens: int,
     response_format: Any | None = None,
-) -> tuple[str, Any, int | None, Any, float]:
+    n: int = 1,
+    on_delta: Callable[[int, str], None] | None = None,
+) -> tuple[list[str], list[Any], int | None, Any, float]:
+    """Stream a chat completion and return the concatenated output of each choice.
+
+    Streaming lets the first tokens arrive as soon as they are generated instead
+    of blocking on the full response. `stream_options.include_usage` asks the
+    service to send a final usage-only chunk so token accounting still works.
+    With `n > 1` the service samples several completions from one request, so
+    the (shared) prompt is only billed once. `on_delta(choice_index, text)` is
+    called for each content delta as it arrives.
+    """
+
     start = perf_counter()
     extra: dict[str, Any] = {}
     if response_format is not None:
         extra["response_format"] = response_format
-    response = client.chat.completions.create(
+    if n != 1:
+        extra["n"] = n
+    stream = client.chat.completions.create(
         model=deployment,
         messages=messages,
         temperature=temperature,
         max_completion_tokens=max_tokens,
+        stream=True,
+        stream_options={"include_usage": True},
         **extra,
     )
+
+    parts: list[list[str]] = [[] for _ in range(max(1, n))]
+    finish_reasons: list[Any] = [None] * len(parts)
+    usage: Any = None
+    for chunk in stream:
+        chunk_usage = getattr(chunk, "usage", None)
+        if chunk_usage is not None:
+            usage = chunk_usage
+        # Azure sends prompt-filter results and the trailing usage chunk with no choices.
+        for choice in chunk.choices or []:
+            index = getattr(choice, "index", 0) or 0
+            if index >= len(parts):
+                continue
+            delta = getattr(choice, "delta", None)
+            content = getattr(delta, "content", None) if delta is not None else None
+            if content:
+                parts[index].append(content)
+                if on_delta is not None:
+                    on_delta(index, content)
+            if choice.finish_reason is not None:
+                finish_reasons[index] = choice.finish_reason
     elapsed = perf_counter() - start
 
-    output_text = response.choices[0].message.content if response.choices else ""
-    output_text = strip_markdown_fences(output_text)
-    finish_reason = response.choices[0].finish_reason if response.choices else None
-    usage = getattr(response, "usage", None)
+    outputs = [strip_markdown_fences("".join(choice_parts)) for choice_parts in parts]
     accepted_prediction_tokens = accepted_prediction_tokens_from_usage(usage)
-    return output_text, finish_reason, accepted_prediction_tokens, usage, elapsed
+    return outputs, finish_reasons, accepted_prediction_tokens, usage, elapsed
+
+
+def echo_stream_delta(index: int, text: str) -> None:
+    """`on_delta` callback that mirrors choice 0 to stderr as it streams."""
+
+    if index == 0:
+        sys.stderr.write(text)
+        sys.stderr.flush()
+
+
+def run_chat_completion(
+    client: Any,
+    deployment: str,
+    messages: list[Any],
+    temperature: float,
+    max_tokens: int,
+    response_format: Any | None = None,
+    on_delta: Callable[[int, str], None] | None = None,
+) -> tuple[str, Any, int | None, Any, float]:
+    """Single-choice wrapper around `run_chat_completion_choices`."""
+
+    outputs, finish_reasons, accepted_prediction_tokens, usage, elapsed = run_chat_completion_choices(
+        client=client,
+        deployment=deployment,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        response_format=response_format,
+        on_delta=on_delta,
+    )
+    return outputs[0], finish_reasons[0], accepted_prediction_tokens, usage, elapsed
 
 
 def parse_args() -> argparse.Namespace:
+    # Read after .env loading in main(), so .env values show up as defaults.
+    env = os.environ
     parser = argparse.ArgumentParser(description="Generate SuiteCRM code snippets using Azure OpenAI.")
     parser.add_argument(
         "--prompt",
-        default=str(Path(__file__).resolve().parent.parent / "prompt.txt"),
-        help="Path to the primary prompt file.",
+        nargs="+",
+        default=[str(Path(__file__).resolve().parent.parent / "prompt.txt")],
+        help=(
+            "Path to the primary prompt file. (output-mode=text) Several prompts run back-to-back over the "
+            "same context; prompt i > 0 is written to <output stem>.p<i><suffix>."
+        ),
     )
     parser.add_argument(
         "--sources",
@@ -511,6 +684,11 @@ def parse_args() -> argparse.Namespace:
         default=[],
         help="Files or directories to use as context snippets.",
     )
+    parser.add_argument(
+        "--sources-manifest",
+        default="",
+        help="Optional file listing additional --sources, one path per line (e.g. produced by CI).",
+    )
     parser.add_argument(
         "--extra-context",
         nargs="*",
@@ -548,7 +726,7 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument(
         "--run-log",
-        default=os.getenv("PYTHON_RUN_LOG", ""),
+        default=env.get("PYTHON_RUN_LOG", ""),
         help="Optional JSONL file to append run timing + diagnostics.",
     )
     parser.add_argument(
@@ -576,47 +754,118 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Skip php -l check during validation (used only with --validate).",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call Azure OpenAI instead of reusing a cached response (responses are only cached at temperature 0).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=float(env.get("LLMCODEGEN_CACHE_TTL", "0")),
+        help="Maximum age in seconds of a reusable cached response (0 = no expiry).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help=(
+            "(output-mode=text) Number of --prompt files to send at once. Higher values finish sooner, "
+            "but concurrent requests may miss the service's prompt cache for the shared context."
+        ),
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=int(env.get("AZURE_OPENAI_MAX_RETRIES", "2")),
+        help="Retries (with exponential backoff) on connection errors, timeouts, 429 and 5xx responses.",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=float(env.get("AZURE_OPENAI_REQUEST_TIMEOUT", "60")),
+        help="Seconds to wait for each response read (each chunk while streaming) before retrying.",
+    )
+    parser.add_argument(
+        "--stream-echo",
+        action="store_true",
+        help="Echo the (first) completion to stderr while it streams in; the output file is written once it completes.",
+    )
+    parser.add_argument(
+        "--semantic-cache-threshold",
+        type=float,
+        default=float(env.get("LLMCODEGEN_SEMANTIC_CACHE_THRESHOLD", "0")),
+        help=(
+            "Reuse the cached response of an earlier prompt whose embedding has at least this cosine "
+            "similarity (e.g. 0.97), when everything else in the request is identical. 0 disables it. "
+            "Requires --embedding-deployment."
+        ),
+    )
+    parser.add_argument(
+        "--embedding-deployment",
+        default=env.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
+        help="Azure OpenAI embeddings deployment used by --semantic-cache-threshold.",
+    )
+    parser.add_argument(
+        "--n",
+        type=int,
+        default=1,
+        help=(
+            "(output-mode=text) Number of completions to sample from one request. "
+            "Choice 0 goes to --output; choice i goes to <output stem>.<i><suffix>."
+        ),
+    )
     parser.add_argument(
         "--max-context-bytes",
         type=int,
         default=60_000,
         help="Maximum number of bytes to include from source files.",
     )
+    parser.add_argument(
+        "--max-context-tokens",
+        type=int,
+        default=int(env.get("LLMCODEGEN_MAX_CONTEXT_TOKENS", "0")),
+        help=(
+            "Estimated token limit for source context; the file that crosses it is truncated and later files "
+            "are dropped before the request (0 = byte limit only). Uses tiktoken when installed, "
+            "else ~4 characters per token."
+        ),
+    )
     parser.add_argument(
         "--temperature",
         type=float,
-        default=float(os.getenv("AZURE_OPENAI_TEMPERATURE", "0.2")),
+        default=float(env.get("AZURE_OPENAI_TEMPERATURE", "0.2")),
         help="Sampling temperature for the model.",
     )
     parser.add_argument(
         "--max-tokens",
         type=int,
-        default=int(os.getenv("AZURE_OPENAI_MAX_TOKENS", "1200")),
+        default=int(env.get("AZURE_OPENAI_MAX_TOKENS", "1200")),
         help="Maximum number of tokens to request from the model.",
     )
     parser.add_argument(
         "--deployment",
-        default=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+        default=env.get("AZURE_OPENAI_DEPLOYMENT"),
         help="Azure OpenAI chat deployment name.",
     )
     parser.add_argument(
         "--endpoint",
-        default=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        default=env.get("AZURE_OPENAI_ENDPOINT"),
         help="Azure OpenAI endpoint (https://<resource>.openai.azure.com).",
     )
     parser.add_argument(
         "--api-key",
-        default=os.getenv("AZURE_OPENAI_KEY") or os.getenv("AZURE_OPENAI_API_KEY"),
+        default=env.get("AZURE_OPENAI_KEY") or env.get("AZURE_OPENAI_API_KEY"),
         help="Azure OpenAI API key.",
     )
     parser.add_argument(
         "--api-version",
-        default=os.getenv("AZURE_OPENAI_API_VERSION", DEFAULT_API_VERSION),
+        default=env.get("AZURE_OPENAI_API_VERSION", DEFAULT_API_VERSION),
         help="Azure OpenAI API version (e.g., 2024-06-01).",
     )
     parser.add_argument(
         "--system",
-        default=os.getenv("AZURE_OPENAI_SYSTEM_PROMPT", DEFAULT_SYSTEM_PROMPT),
+        default=env.get("AZURE_OPENAI_SYSTEM_PROMPT", DEFAULT_SYSTEM_PROMPT),
         help="Override the default system prompt.",
     )
     return parser.parse_args()
@@ -648,9 +897,27 @@ def _is_safe_relative_path(rel_path: str) -> bool:
     return True
 
 
+_B64_STRIP_RE = re.compile(r"\s+")
+_B64_CHARSET_RE = re.compile(r"[A-Za-z0-9+/=_-]+")
+
+
+def _json_loads(data: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps_bytes(payload: Any) -> bytes:
+    """Serialize payload as compact UTF-8 JSON (non-ASCII kept as-is)."""
+
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
 def parse_file_bundle(output_text: str) -> list[dict[str, str]]:
     try:
-        payload = json.loads((output_text or "").strip())
+        payload = _json_loads(output_text or "")
     except Exception as exc:
         raise ValueError(f"Model did not return valid JSON file bundle: {exc}")
 
@@ -682,34 +949,27 @@ def parse_file_bundle(output_text: str) -> list[dict[str, str]]:
             except Exception:
                 decoded = None
         if isinstance(content_b64, str) and content_b64.strip():
-            raw_b64 = re.sub(r"\s+", "", content_b64.strip())
-            if re.fullmatch(r"[A-Za-z0-9+/=_-]+", raw_b64) is None:
-                if content.strip():
-                    decoded = content
-                else:
-                    # Best-effort fallback: treat provided value as literal content.
-                    decoded = content_b64
-            else:
-                padded = raw_b64 + ("=" * ((4 - (len(raw_b64) % 4)) % 4))
+            raw_b64 = _B64_STRIP_RE.sub("", content_b64.strip())
+            decoded_bytes: bytes | None = None
+            if _B64_CHARSET_RE.fullmatch(raw_b64) is not None:
+                padded = raw_b64 + "=" * (-len(raw_b64) % 4)
+                try:
+                    # altchars maps the URL-safe alphabet onto the standard one, so
+                    # both variants decode in a single strict pass.
+                    decoded_bytes = base64.b64decode(padded, altchars=b"-_", validate=True)
+                except ValueError:
+                    decoded_bytes = None
+
+            if decoded_bytes is not None:
                 try:
-                    decoded_bytes = base64.b64decode(padded, validate=False)
-                    try:
-                        decoded = decoded_bytes.decode("utf-8")
-                    except UnicodeDecodeError:
-                        decoded = decoded_bytes.decode("latin-1")
-                except Exception:
-                    try:
-                        decoded_bytes = base64.urlsafe_b64decode(padded)
-                        try:
-                            decoded = decoded_bytes.decode("utf-8")
-                        except UnicodeDecodeError:
-                            decoded = decoded_bytes.decode("latin-1")
-                    except Exception as exc:
-                        if content.strip():
-                            decoded = content
-                        else:
-                            # Best-effort fallback: treat provided value as literal content.
-                            decoded = content_b64
+                    decoded = decoded_bytes.decode("utf-8")
+                except UnicodeDecodeError:
+                    decoded = decoded_bytes.decode("latin-1")
+            elif content.strip():
+                decoded = content
+            else:
+                # Best-effort fallback: treat provided value as literal content.
+                decoded = content_b64
         elif content.strip():
             # Back-compat if a model returns plain content.
             decoded = content
@@ -782,13 +1042,189 @@ def repair_file_bundle_json(
 
 
 def append_jsonl(path: Path, payload: dict[str, Any]) -> None:
+    append_jsonl_records(path, [payload])
+
+
+def append_jsonl_records(path: Path, payloads: Iterable[dict[str, Any]]) -> None:
+    """Append several JSONL records with a single open and write."""
+
+    data = b"".join(_json_dumps_bytes(payload) + b"\n" for payload in payloads)
+    if not data:
+        return
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8") as handle:
-        handle.write(json.dumps(payload, ensure_ascii=False) + "\n")
+    with path.open("ab") as handle:
+        handle.write(data)
+
+
+RESPONSE_CACHE_DIR = Path(
+    os.getenv("LLMCODEGEN_CACHE_DIR", str(Path.home() / ".cache" / "llmcodegen"))
+).expanduser()
+
+
+def response_cache_key(
+    *,
+    deployment: str,
+    api_version: str,
+    messages: list[Any],
+    temperature: float,
+    max_tokens: int,
+    response_format: Any | None,
+    n: int,
+) -> str:
+    material = json.dumps(
+        {
+            "deployment": deployment,
+            "api_version": api_version,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "response_format": response_format,
+            "n": n,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.blake2b(material.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _usage_to_dict(usage: Any) -> Any:
+    if usage is None or isinstance(usage, (int, float, str)):
+        return usage
+    if isinstance(usage, dict):
+        return {k: _usage_to_dict(v) for k, v in usage.items()}
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump()
+    return {k: _usage_to_dict(v) for k, v in vars(usage).items()}
+
+
+def _usage_from_dict(payload: Any) -> Any:
+    # Callers read usage with getattr(), so rebuild attribute access.
+    if isinstance(payload, dict):
+        return SimpleNamespace(**{k: _usage_from_dict(v) for k, v in payload.items()})
+    return payload
+
+
+def load_cached_response(key: str, ttl_seconds: float) -> tuple[list[str], list[Any], int | None, Any, float] | None:
+    """Return a cached (outputs, finish_reasons, accepted, usage, elapsed) tuple, if fresh."""
+
+    path = RESPONSE_CACHE_DIR / f"{key}.json"
+    try:
+        if ttl_seconds > 0 and time() - path.stat().st_mtime > ttl_seconds:
+            return None
+        payload = _json_loads(path.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+    usage = _usage_from_dict(payload.get("usage"))
+    return (
+        list(payload.get("outputs") or [""]),
+        list(payload.get("finish_reasons") or [None]),
+        accepted_prediction_tokens_from_usage(usage),
+        usage,
+        float(payload.get("elapsed") or 0.0),
+    )
+
+
+def store_cached_response(
+    key: str,
+    *,
+    outputs: list[str],
+    finish_reasons: list[Any],
+    usage: Any,
+    elapsed: float,
+) -> None:
+    path = RESPONSE_CACHE_DIR / f"{key}.json"
+    payload = {
+        "outputs": outputs,
+        "finish_reasons": finish_reasons,
+        "usage": _usage_to_dict(usage),
+        "elapsed": elapsed,
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(_json_dumps_bytes(payload))
+        os.replace(tmp_path, path)
+    except OSError:
+        # The cache is an optimization; a read-only home directory must not fail the run.
+        pass
+
+
+SEMANTIC_CACHE_PATH = RESPONSE_CACHE_DIR / "semantic.sqlite"
+
+
+def embed_text(client: Any, deployment: str, text: str) -> list[float]:
+    response = client.embeddings.create(model=deployment, input=text)
+    return list(response.data[0].embedding)
+
+
+def _connect_semantic_cache() -> sqlite3.Connection:
+    SEMANTIC_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(SEMANTIC_CACHE_PATH)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS prompts ("
+        "response_key TEXT PRIMARY KEY, scope TEXT NOT NULL, vec BLOB NOT NULL, ts REAL NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS prompts_scope ON prompts (scope)")
+    return conn
+
+
+def lookup_semantic_cache(scope: str, vector: list[float], threshold: float) -> tuple[str, float] | None:
+    """Return (response_key, similarity) of the closest cached prompt within scope.
+
+    `scope` hashes everything except the task prompt (deployment, sampling
+    settings, system prompt and context), so only rewordings of a prompt over
+    identical inputs can match. Returns None below `threshold` cosine similarity.
+    """
+
+    query = array("f", vector)
+    query_norm = math.sqrt(sum(v * v for v in query)) or 1.0
+    best: tuple[str, float] | None = None
+    try:
+        with closing(_connect_semantic_cache()) as conn:
+            rows = conn.execute("SELECT response_key, vec FROM prompts WHERE scope = ?", (scope,)).fetchall()
+    except (OSError, sqlite3.Error):
+        return None
+
+    for response_key, blob in rows:
+        candidate = array("f")
+        candidate.frombytes(blob)
+        if len(candidate) != len(query):
+            continue
+        norm = math.sqrt(sum(v * v for v in candidate)) or 1.0
+        similarity = sum(a * b for a, b in zip(query, candidate)) / (query_norm * norm)
+        if similarity >= threshold and (best is None or similarity > best[1]):
+            best = (response_key, similarity)
+    return best
+
+
+def remember_semantic_cache(scope: str, response_key: str, vector: list[float]) -> None:
+    try:
+        with closing(_connect_semantic_cache()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO prompts (response_key, scope, vec, ts) VALUES (?, ?, ?, ?)",
+                (response_key, scope, array("f", vector).tobytes(), time()),
+            )
+    except (OSError, sqlite3.Error):
+        # Like the response cache, this is best-effort.
+        pass
+
+
+# (epoch second, "YYYY-MM-DDTHH:MM:SS") of the last utc_now_iso() call; one tuple
+# so threads always see a matching pair.
+_UTC_SECOND_PREFIX: tuple[int, str] = (-1, "")
 
 
 def utc_now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+    # Same shape as datetime.now(timezone.utc).isoformat(), but only the
+    # microseconds are formatted per call; the date/time part changes once a second.
+    global _UTC_SECOND_PREFIX
+    seconds, nanos = divmod(time_ns(), 1_000_000_000)
+    cached_second, prefix = _UTC_SECOND_PREFIX
+    if seconds != cached_second:
+        prefix = strftime("%Y-%m-%dT%H:%M:%S", gmtime(seconds))
+        _UTC_SECOND_PREFIX = (seconds, prefix)
+    return f"{prefix}.{nanos // 1000:06d}+00:00"
 
 
 def load_text(path: Path) -> str:
@@ -800,13 +1236,147 @@ def load_text(path: Path) -> str:
         return path.read_text(encoding="latin-1", errors="replace")
 
 
-def iter_source_files(paths: list[str], *, base_root: Path | None = None) -> Iterator[Path]:
+def read_text_prefix(path: Path, byte_limit: int) -> tuple[str, int]:
+    """Read at most `byte_limit` bytes from `path` and decode them.
+
+    Returns the decoded text plus the number of bytes consumed, so callers can
+    charge a byte budget without reading (and re-encoding) the whole file. A
+    multi-byte UTF-8 sequence cut off at the limit is dropped; files that are
+    not UTF-8 fall back to latin-1 like `load_text`.
+    """
+
+    with path.open("rb") as handle:
+        data = handle.read(max(0, byte_limit))
+    return decode_text_prefix(data), len(data)
+
+
+def decode_text_prefix(data: bytes) -> str:
+    """Decode a file prefix read by `read_text_prefix` / `iter_file_prefixes`."""
+
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        if exc.reason == "unexpected end of data":
+            return data.decode("utf-8", errors="ignore")
+        return data.decode("latin-1", errors="replace")
+
+
+def _read_file_prefix(path: Path, byte_limit: int) -> bytes:
+    with path.open("rb") as handle:
+        return handle.read(byte_limit)
+
+
+def iter_file_prefixes(paths: Iterable[Path], byte_limit: int) -> Iterator[tuple[Path, bytes]]:
+    """Yield (path, first byte_limit bytes) for each path, in order.
+
+    Reads run on a small thread pool (file reads release the GIL) with a
+    bounded number in flight, so a caller that stops early - e.g. once a byte
+    budget is spent - only pays for a few reads past that point.
+    """
+
+    in_flight = min(32, (os.cpu_count() or 1) * 4)
+    executor = ThreadPoolExecutor(max_workers=in_flight)
+    pending: deque[tuple[Path, Future[bytes]]] = deque()
+    try:
+        for path in paths:
+            pending.append((path, executor.submit(_read_file_prefix, path, byte_limit)))
+            if len(pending) >= in_flight:
+                head, future = pending.popleft()
+                yield head, future.result()
+        while pending:
+            head, future = pending.popleft()
+            yield head, future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _walk_source_files(directory: str, dir_mtimes: dict[str, int] | None = None) -> Iterator[Path]:
+    """Depth-first `os.scandir` walk yielding supported files.
+
+    Entries are sorted per directory, which reproduces the order of
+    `sorted(Path.rglob("*"))` while letting callers stop before the whole tree
+    is listed. Extensions are checked on the entry name, so non-source files
+    never cost a stat call. Symlinked directories and `EXCLUDED_DIR_NAMES`
+    subtrees are not followed.
+
+    If `dir_mtimes` is given, the mtime of every directory walked is recorded
+    in it (taken before listing, so a concurrent change invalidates it).
+    """
+
+    try:
+        if dir_mtimes is not None:
+            dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+        with os.scandir(directory) as entries:
+            ordered = sorted(entries, key=lambda entry: os.path.normcase(entry.name))
+    except OSError:
+        return
+
+    for entry in ordered:
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name not in EXCLUDED_DIR_NAMES:
+                yield from _walk_source_files(entry.path, dir_mtimes)
+        elif entry.name.lower().endswith(_SUPPORTED_SUFFIXES):
+            yield Path(entry.path)
+
+
+SOURCE_LISTING_CACHE_DIR = RESPONSE_CACHE_DIR / "listings"
+
+
+def list_source_files_cached(directory: str) -> list[Path]:
+    """Return the full `_walk_source_files` listing of directory, cached across runs.
+
+    The cache stores the mtime of every directory in the tree. Creating,
+    deleting or renaming an entry changes the mtime of its parent directory, so
+    one stat per directory validates the listing without rescanning it.
+    """
+
+    # The pruned names are part of the key so listings made with another set are not reused.
+    key_source = "\0".join([directory, *sorted(EXCLUDED_DIR_NAMES)])
+    key = hashlib.blake2b(key_source.encode("utf-8"), digest_size=16).hexdigest()
+    cache_path = SOURCE_LISTING_CACHE_DIR / f"{key}.json"
+    try:
+        payload = _json_loads(cache_path.read_bytes())
+        if payload["root"] == directory and all(
+            os.stat(path).st_mtime_ns == mtime for path, mtime in payload["dirs"].items()
+        ):
+            return [Path(path) for path in payload["files"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    dir_mtimes: dict[str, int] = {}
+    files = list(_walk_source_files(directory, dir_mtimes))
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(
+            _json_dumps_bytes({"root": directory, "dirs": dir_mtimes, "files": [str(path) for path in files]})
+        )
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    return files
+
+
+def iter_source_files(
+    paths: list[str], *, base_root: Path | None = None, cache_listing: bool = False
+) -> Iterator[Path]:
     """Yield source files from provided paths.
 
     If a path does not exist relative to the current working directory, and a
     base_root is provided, we also try resolving it relative to base_root.
+
+    With cache_listing, directories are listed through
+    `list_source_files_cached`. That only pays off for callers that consume the
+    whole listing; a budgeted caller stops after a few files and is better
+    served by the lazy walk.
+
+    Files are yielded in source order and each file only once, even when
+    sources overlap (e.g. a directory plus a file inside it). A repeated file
+    would otherwise spend context budget twice and shift every later byte of
+    the prompt, defeating prefix caching between runs.
     """
 
+    seen: set[Path] = set()
     for raw in paths:
         candidate = Path(raw)
         if not candidate.is_absolute() and not candidate.exists() and base_root is not None:
@@ -815,25 +1385,87 @@ def iter_source_files(paths: list[str], *, base_root: Path | None = None) -> Ite
                 candidate = alt
 
         if candidate.is_dir():
-            for file_path in sorted(candidate.rglob("*")):
-                if file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                    yield file_path.resolve()
+            directory = str(candidate.resolve())
+            found: Iterable[Path] = (
+                list_source_files_cached(directory) if cache_listing else _walk_source_files(directory)
+            )
         elif candidate.is_file() and candidate.suffix.lower() in SUPPORTED_EXTENSIONS:
-            yield candidate.resolve()
+            found = iter((candidate.resolve(),))
+        else:
+            continue
+
+        for file_path in found:
+            if file_path not in seen:
+                seen.add(file_path)
+                yield file_path
+
+
+@functools.lru_cache(maxsize=1)
+def _token_encoding() -> Any | None:
+    try:  # pragma: no cover - optional, only sharpens token estimates
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # pragma: no cover
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the prompt tokens for text (tiktoken if installed, else ~4 chars/token)."""
+
+    encoding = _token_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4
 
 
-def gather_context(paths: list[str], byte_budget: int, *, base_root: Path | None = None) -> str:
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Return the longest prefix of text estimated at no more than max_tokens."""
+
+    if max_tokens <= 0:
+        return ""
+    encoding = _token_encoding()
+    if encoding is not None:
+        token_ids = encoding.encode(text, disallowed_special=())
+        if len(token_ids) <= max_tokens:
+            return text
+        return encoding.decode(token_ids[:max_tokens])
+    return text[: max_tokens * 4]
+
+
+def gather_context(
+    paths: list[str],
+    byte_budget: int,
+    *,
+    base_root: Path | None = None,
+    token_budget: int = 0,
+    files: Iterable[Path] | None = None,
+) -> str:
+    """Concatenate source snippets up to byte_budget bytes.
+
+    With a positive token_budget, files are also packed greedily to that many
+    estimated tokens: the file that crosses it is cut to the tokens still
+    available and later files are left out, so an oversized prompt is trimmed
+    locally instead of being rejected by Azure after a round-trip.
+
+    A caller that already listed `paths` through `iter_source_files` can pass
+    that listing as files, so the sources are not walked a second time.
+    """
+
     if not paths or byte_budget <= 0:
         return ""
 
     snippets: list[str] = []
     remaining = byte_budget
+    tokens = 0
 
-    for file_path in iter_source_files(paths, base_root=base_root):
-        try:
-            text = file_path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            text = file_path.read_text(encoding="latin-1", errors="replace")
+    if files is None:
+        files = iter_source_files(paths, base_root=base_root)
+
+    for file_path, data in iter_file_prefixes(files, byte_budget):
+        # Prefixes are read up to the full budget ahead of time; keep what is left of it.
+        data = data[:remaining]
+        chunk, consumed = decode_text_prefix(data), len(data)
 
         display_path: str
         if base_root is not None:
@@ -844,39 +1476,75 @@ def gather_context(paths: list[str], byte_budget: int, *, base_root: Path | None
         else:
             display_path = str(file_path)
 
-        encoded = text.encode("utf-8")
-        chunk = encoded[:remaining].decode("utf-8", errors="ignore")
-        snippets.append(
-            textwrap.dedent(
-                f"""// file: {display_path}
-{chunk}
-"""
-            ).strip()
-        )
-        remaining -= len(chunk.encode("utf-8"))
+        snippet = f"// file: {display_path}\n{chunk}".rstrip()
+        if token_budget > 0:
+            snippet_tokens = estimate_tokens(snippet)
+            if tokens + snippet_tokens > token_budget:
+                snippet = truncate_to_tokens(snippet, token_budget - tokens).rstrip()
+                # Keep the cut file only if some of its content (not just the header) fits.
+                if "\n" in snippet:
+                    snippets.append(snippet)
+                break
+            tokens += snippet_tokens
+        snippets.append(snippet)
+        remaining -= consumed
         if remaining <= 0:
             break
 
     return "\n\n".join(snippets)
 
 
+@functools.lru_cache(maxsize=4)
+def _stripped_system_prompt(system_prompt: str) -> str:
+    # The system prompt is fixed per process while build_messages runs once per
+    # prompt/variant, so strip (and copy) it once.
+    return system_prompt.strip()
+
+
 def build_messages(system_prompt: str, prompt: str, context: str) -> list[Any]:
+    """Build chat messages with the immutable content first.
+
+    The system prompt and gathered context are identical across runs over the
+    same sources, so keeping them ahead of the task prompt (and free of per-run
+    values like timestamps or run ids) lets Azure OpenAI's automatic prefix
+    caching reuse the prefill for everything but the final task message.
+    """
+
+    messages: list[Any] = [{"role": "system", "content": _stripped_system_prompt(system_prompt)}]
     if context:
-        user_prompt = f"Context:\n{context}\n\nTask:\n{prompt.strip()}"
+        messages.append({"role": "user", "content": f"Context:\n{context}"})
+        messages.append({"role": "user", "content": f"Task:\n{prompt.strip()}"})
     else:
-        user_prompt = prompt.strip()
+        messages.append({"role": "user", "content": prompt.strip()})
+    return messages
 
-    return [
-        {"role": "system", "content": system_prompt.strip()},
-        {"role": "user", "content": user_prompt},
-    ]
+
+def resolve_cli_path(raw: str) -> Path:
+    """Expand ~ and anchor a relative CLI path at the current directory."""
+
+    path = Path(raw).expanduser()
+    if not path.is_absolute():
+        path = (Path.cwd() / path).resolve()
+    return path
+
+
+def _load_validator() -> tuple[Any, Any]:
+    """Return (validation_run_record, validate_files), or (None, None) if unavailable."""
+
+    try:  # pragma: no cover - optional import for in-process validation
+        from validate_generated_output import validate_files, validation_run_record
+    except Exception:  # pragma: no cover
+        return None, None
+    return validation_run_record, validate_files
 
 
 def main() -> int:
-    if load_dotenv is not None:
-        load_dotenv()  # pragma: no cover
-    else:
+    try:  # pragma: no cover
+        from dotenv import load_dotenv
+    except ModuleNotFoundError:  # pragma: no cover
         load_dotenv_fallback()
+    else:
+        load_dotenv()  # pragma: no cover
 
     prefer_deployment_from_dotenv()
 
@@ -890,9 +1558,22 @@ def main() -> int:
     if args.output_mode == OUTPUT_MODE_MODULE and not (args.module_name or "").strip():
         raise ValueError("--module-name is required when --output-mode=module")
 
+    if args.n < 1:
+        raise ValueError("--n must be at least 1")
+    if args.n > 1 and args.output_mode == OUTPUT_MODE_MODULE:
+        raise ValueError("--n > 1 is only supported with --output-mode=text")
+    if len(args.prompt) > 1 and args.output_mode == OUTPUT_MODE_MODULE:
+        raise ValueError("Multiple --prompt files are only supported with --output-mode=text")
+    if args.semantic_cache_threshold > 0 and not args.embedding_deployment:
+        raise ValueError("--semantic-cache-threshold requires --embedding-deployment (or AZURE_OPENAI_EMBEDDING_DEPLOYMENT)")
+
     args.endpoint = normalize_azure_endpoint(args.endpoint)
 
-    prompt_text = load_text(Path(args.prompt))
+    if (args.sources_manifest or "").strip():
+        manifest_lines = load_text(Path(args.sources_manifest)).splitlines()
+        args.sources = list(args.sources or []) + [line.strip() for line in manifest_lines if line.strip()]
+
+    prompt_texts = [load_text(Path(prompt_path)) for prompt_path in args.prompt]
 
     extra_context_text = ""
     extra_chunks: list[str] = []
@@ -907,50 +1588,151 @@ def main() -> int:
     if extra_chunks:
         extra_context_text = "\n\n".join(extra_chunks).strip()
 
-    if AzureOpenAI is None:
-        raise RuntimeError("The 'openai' package is required to call the Azure OpenAI API.")
+    try:  # pragma: no cover - optional dependency resolution
+        from openai import AzureOpenAI
+    except ModuleNotFoundError:  # pragma: no cover - helpful message at runtime
+        raise RuntimeError("The 'openai' package is required to call the Azure OpenAI API.") from None
 
     client = AzureOpenAI(
         api_key=args.api_key,
         azure_endpoint=args.endpoint,
         api_version=args.api_version,
+        http_client=create_http_client(float(args.request_timeout)),
+        max_retries=max(0, int(args.max_retries)),
+        timeout=float(args.request_timeout),
     )
 
-    def run_one() -> tuple[str, Path | None, list[Path] | None, float]:
-        approach = APPROACH_RAW
-        run_id = (args.run_id or "").strip() or str(uuid.uuid4())
+    # Resolved once per run and shared by context gathering, the function-patch
+    # fallback, run logging and validation.
+    suitecrm_root = resolve_cli_path(args.suitecrm_root)
+    patch_target_path = resolve_cli_path(args.sources[0]) if args.sources else None
+    run_log_path = resolve_cli_path(args.run_log) if (args.run_log or "").strip() else None
+
+    # Prefer SuiteCRM-root relative paths in context so generated patches
+    # target repo paths like include/Foo.php instead of filesystem paths.
+    base_root = suitecrm_root
+
+    # Context is gathered once; every prompt shares the same system + context
+    # prefix, so requests after the first are served from the prompt cache.
+    context = gather_context(
+        args.sources,
+        int(args.max_context_bytes),
+        base_root=base_root,
+        token_budget=int(args.max_context_tokens),
+    )
 
-        run_started = utc_now_iso()
+    if extra_context_text:
+        context = (extra_context_text + "\n\n" + (context or "").strip()).strip()
 
-        # Prefer SuiteCRM-root relative paths in context so generated patches
-        # target repo paths like include/Foo.php instead of filesystem paths.
-        base_root: Path | None = None
-        try:
-            base_root = Path(args.suitecrm_root).expanduser()
-            if not base_root.is_absolute():
-                base_root = (Path.cwd() / base_root).resolve()
-        except Exception:
-            base_root = None
+    # Bundle instructions are constant, so they live in the cacheable system prefix.
+    system_prompt = args.system
+    if args.output_mode == OUTPUT_MODE_MODULE:
+        system_prompt = f"{args.system.strip()}\n\n{FILE_BUNDLE_INSTRUCTIONS}"
+
+    approach = APPROACH_RAW
+
+    # Run-log fields that are the same for every prompt; run_one only adds the per-run ones.
+    run_log_template: dict[str, Any] = {
+        "tool": "generate_from_codebase",
+        "approach": approach,
+        "output_mode": args.output_mode,
+        "deployment": args.deployment,
+        "api_version": args.api_version,
+        "sources": args.sources,
+        "max_context_bytes": args.max_context_bytes,
+        "max_context_tokens": args.max_context_tokens,
+        "temperature": args.temperature,
+        "max_tokens": args.max_tokens,
+        "n": args.n,
+    }
+
+    def run_one(
+        prompt_path: str,
+        prompt_text: str,
+        run_id: str,
+        text_output_path: Path,
+        stream_echo: bool = False,
+    ) -> tuple[str, Path | None, list[Path] | None, float]:
 
-        context = gather_context(args.sources, int(args.max_context_bytes), base_root=base_root)
+        run_started = utc_now_iso()
 
-        if extra_context_text:
-            context = (extra_context_text + "\n\n" + (context or "").strip()).strip()
+        messages = build_messages(system_prompt, prompt_text, context)
+        response_format = {"type": "json_object"} if args.output_mode == OUTPUT_MODE_MODULE else None
 
-        effective_prompt = prompt_text
-        if args.output_mode == OUTPUT_MODE_MODULE:
-            effective_prompt = f"{prompt_text.strip()}\n\n{FILE_BUNDLE_INSTRUCTIONS}"
+        # Only deterministic requests are cached; a sampled response is not a
+        # valid answer for the next run.
+        cache_key: str | None = None
+        if not args.no_cache and float(args.temperature) == 0.0:
+            cache_key = response_cache_key(
+                deployment=args.deployment,
+                api_version=args.api_version,
+                messages=messages,
+                temperature=float(args.temperature),
+                max_tokens=int(args.max_tokens),
+                response_format=response_format,
+                n=int(args.n),
+            )
 
-        messages = build_messages(args.system, effective_prompt, context)
-        response_format = {"type": "json_object"} if args.output_mode == OUTPUT_MODE_MODULE else None
-        output_text, finish_reason, accepted_prediction_tokens, usage, elapsed = run_chat_completion(
-            client=client,
-            deployment=args.deployment,
-            messages=messages,
-            temperature=args.temperature,
-            max_tokens=args.max_tokens,
-            response_format=response_format,
-        )
+        lookup_started = perf_counter()
+        cached = load_cached_response(cache_key, float(args.cache_ttl)) if cache_key else None
+
+        # Near-duplicate prompts over the same inputs can reuse an earlier
+        # response (opt-in: a reworded prompt may still ask for different code).
+        semantic_scope: str | None = None
+        prompt_vector: list[float] | None = None
+        semantic_similarity: float | None = None
+        if cache_key and cached is None and float(args.semantic_cache_threshold) > 0:
+            semantic_scope = response_cache_key(
+                deployment=args.deployment,
+                api_version=args.api_version,
+                messages=messages[:-1],
+                temperature=float(args.temperature),
+                max_tokens=int(args.max_tokens),
+                response_format=response_format,
+                n=int(args.n),
+            )
+            prompt_vector = embed_text(client, args.embedding_deployment, prompt_text)
+            match = lookup_semantic_cache(semantic_scope, prompt_vector, float(args.semantic_cache_threshold))
+            if match is not None:
+                cached = load_cached_response(match[0], float(args.cache_ttl))
+                if cached is not None:
+                    semantic_similarity = round(match[1], 4)
+
+        # On a hit the stored timing and usage belong to the run that called the
+        # model; they are kept as cached_* diagnostics and this run logs its own.
+        cached_usage: Any = None
+        cached_elapsed: float | None = None
+        if cached is not None:
+            response_cache = "hit" if semantic_similarity is None else "semantic_hit"
+            outputs, finish_reasons, _cached_accepted, cached_usage, cached_elapsed = cached
+            accepted_prediction_tokens, usage = 0, None
+            elapsed = perf_counter() - lookup_started
+        else:
+            response_cache = "miss" if cache_key else "off"
+            outputs, finish_reasons, accepted_prediction_tokens, usage, elapsed = run_chat_completion_choices(
+                client=client,
+                deployment=args.deployment,
+                messages=messages,
+                temperature=args.temperature,
+                max_tokens=args.max_tokens,
+                response_format=response_format,
+                n=int(args.n),
+                on_delta=echo_stream_delta if stream_echo else None,
+            )
+            if stream_echo:
+                sys.stderr.write("\n")
+            if cache_key and any((text or "").strip() for text in outputs):
+                store_cached_response(
+                    cache_key,
+                    outputs=outputs,
+                    finish_reasons=finish_reasons,
+                    usage=usage,
+                    elapsed=elapsed,
+                )
+                if semantic_scope is not None and prompt_vector is not None:
+                    remember_semantic_cache(semantic_scope, cache_key, prompt_vector)
+        output_text = outputs[0]
+        finish_reason = finish_reasons[0]
 
         run_finished = utc_now_iso()
 
@@ -960,7 +1742,41 @@ def main() -> int:
                 "Fix: deploy a chat-capable model (e.g., gpt-4o / gpt-4.1) and set AZURE_OPENAI_DEPLOYMENT to that deployment name."
             )
 
+        def write_text_output(path: Path, text: str) -> None:
+            generated_patch: str | None = None
+            if not looks_like_unified_diff(text):
+                function_name = infer_target_function_name(prompt_text)
+                if function_name and patch_target_path is not None:
+                    generated_patch = build_patch_from_function_output(
+                        suitecrm_root=suitecrm_root,
+                        target_path=patch_target_path,
+                        function_name=function_name,
+                        function_output=text,
+                    )
+
+            with path.open("w", encoding="utf-8", newline="", buffering=1 << 16) as handle:
+                if generated_patch is None and text and "@@" in text and text.strip():
+                    # Normalized diff lines are written as they are produced; only
+                    # the hunk currently being recounted is held in memory.
+                    # Trailing empty lines are dropped, as the splitlines/join passes did.
+                    pending_blank = 0
+                    for line in iter_normalized_unified_diff_lines(text):
+                        if not line:
+                            pending_blank += 1
+                            continue
+                        handle.write("\n" * pending_blank)
+                        pending_blank = 0
+                        handle.write(line)
+                        handle.write("\n")
+                    return
+
+                output = text if generated_patch is None else generated_patch
+                handle.write(output)
+                if (output or "").strip() and not output.endswith("\n"):
+                    handle.write("\n")
+
         output_path: Path | None = None
+        choice_output_paths: list[Path] = []
         written_files: list[Path] | None = None
         if args.output_mode == OUTPUT_MODE_MODULE:
             try:
@@ -977,132 +1793,125 @@ def main() -> int:
             module_name = default_module_name_for_approach(args.module_name, approach, False)
             written_files = write_module_files(modules_root=modules_root, module_name=module_name, files=files)
         else:
-            output_path = Path(args.output).resolve()
+            output_path = text_output_path
 
             output_path.parent.mkdir(parents=True, exist_ok=True)
-            normalized_output = output_text
+            write_text_output(output_path, output_text)
 
-            generated_locally = False
-            if not looks_like_unified_diff(normalized_output):
-                function_name = infer_target_function_name(prompt_text)
-                if function_name and args.sources:
-                    suitecrm_root = Path(args.suitecrm_root).expanduser()
-                    if not suitecrm_root.is_absolute():
-                        suitecrm_root = (Path.cwd() / suitecrm_root).resolve()
-                    target_path = Path(args.sources[0]).expanduser()
-                    if not target_path.is_absolute():
-                        target_path = (Path.cwd() / target_path).resolve()
-
-                    normalized_output = build_patch_from_function_output(
-                        suitecrm_root=suitecrm_root,
-                        target_path=target_path,
-                        function_name=function_name,
-                        function_output=normalized_output,
-                    )
-                    generated_locally = True
-
-            if not generated_locally:
-                normalized_output = normalize_unified_diff_hunk_blank_lines(normalized_output)
-                normalized_output = normalize_unified_diff_hunk_counts(normalized_output)
-            if (normalized_output or "").strip() and not normalized_output.endswith("\n"):
-                normalized_output += "\n"
-            output_path.write_text(normalized_output, encoding="utf-8", newline="")
-
-        if (args.run_log or "").strip():
-            run_log_path = Path(args.run_log).expanduser()
-            if not run_log_path.is_absolute():
-                run_log_path = (Path.cwd() / run_log_path).resolve()
+            for index, choice_text in enumerate(outputs[1:], start=1):
+                choice_path = output_path.with_name(f"{output_path.stem}.{index}{output_path.suffix}")
+                write_text_output(choice_path, choice_text)
+                choice_output_paths.append(choice_path)
 
-            prompt_tokens = getattr(usage, "prompt_tokens", None) if usage else None
-            completion_tokens = getattr(usage, "completion_tokens", None) if usage else None
-            total_tokens = getattr(usage, "total_tokens", None) if usage else None
+        if run_log_path is not None:
+            if cached is not None:
+                prompt_tokens = completion_tokens = total_tokens = 0
+            else:
+                prompt_tokens = getattr(usage, "prompt_tokens", None) if usage else None
+                completion_tokens = getattr(usage, "completion_tokens", None) if usage else None
+                total_tokens = getattr(usage, "total_tokens", None) if usage else None
 
             log_payload: dict[str, Any] = {
                 "run_id": run_id,
                 "parent_run_id": None,
-                "tool": "generate_from_codebase",
-                "approach": approach,
-                "output_mode": args.output_mode,
+                **run_log_template,
                 "started_at_utc": run_started,
                 "finished_at_utc": run_finished,
                 "duration_seconds": round(elapsed, 3),
-                "deployment": args.deployment,
-                "api_version": args.api_version,
                 "output_path": str(output_path) if output_path is not None else "",
                 "written_files": [str(p) for p in (written_files or [])],
-                "sources": args.sources,
-                "max_context_bytes": args.max_context_bytes,
-                "temperature": args.temperature,
-                "max_tokens": args.max_tokens,
+                "choice_output_paths": [str(p) for p in choice_output_paths],
+                "prompt_path": prompt_path,
                 "diagnostics": {
                     "finish_reason": finish_reason,
+                    "choice_finish_reasons": finish_reasons,
+                    "response_cache": response_cache,
+                    "semantic_cache_similarity": semantic_similarity,
                     "accepted_prediction_tokens": accepted_prediction_tokens,
                     "prompt_tokens": prompt_tokens,
                     "completion_tokens": completion_tokens,
                     "total_tokens": total_tokens,
+                    "cached_duration_seconds": round(cached_elapsed, 3) if cached_elapsed is not None else None,
+                    "cached_prompt_tokens": getattr(cached_usage, "prompt_tokens", None) if cached_usage else None,
+                    "cached_completion_tokens": getattr(cached_usage, "completion_tokens", None) if cached_usage else None,
+                    "cached_total_tokens": getattr(cached_usage, "total_tokens", None) if cached_usage else None,
                     "output_length": len((output_text or "").strip()),
                 },
             }
 
-            append_jsonl(run_log_path, log_payload)
-
-            # Text-mode validation: validate the single output file.
+            # Text mode validates the single output file; module mode validates each written file.
+            validation_targets: list[Path] = []
+            validation_run_record = validate_files = None
+            if args.validate or args.validate_written:
+                validation_run_record, validate_files = _load_validator()
             if args.validate and output_path is not None:
-                if validate_file is None or append_validation_run is None:
+                if validate_files is None or validation_run_record is None:
                     raise RuntimeError(
                         "Validation requested but validator helpers could not be imported. "
                         "Ensure validate_generated_output.py is present and importable."
                     )
+                validation_targets.append(output_path)
+                validation_targets.extend(choice_output_paths)
 
-                suitecrm_root = Path(args.suitecrm_root).expanduser()
-                if not suitecrm_root.is_absolute():
-                    suitecrm_root = (Path.cwd() / suitecrm_root).resolve()
-
-                report, findings = validate_file(
-                    input_path=output_path,
-                    suitecrm_root=suitecrm_root,
-                    no_php_lint=bool(args.no_php_lint),
-                )
-                append_validation_run(
-                    run_log_path=run_log_path,
-                    run_id=run_id,
-                    input_path=output_path,
-                    suitecrm_root=suitecrm_root,
-                    report=report,
-                    findings=findings,
-                )
-
-            # Module-mode validation: validate each written file.
             if args.output_mode == OUTPUT_MODE_MODULE and args.validate_written and written_files:
-                if validate_file is None or append_validation_run is None:
+                if validate_files is None or validation_run_record is None:
                     raise RuntimeError(
                         "--validate-written requested but validator helpers could not be imported. "
                         "Ensure validate_generated_output.py is present and importable."
                     )
-
-                suitecrm_root = Path(args.suitecrm_root).expanduser()
-                if not suitecrm_root.is_absolute():
-                    suitecrm_root = (Path.cwd() / suitecrm_root).resolve()
-
-                for file_path in written_files:
-                    report, findings = validate_file(
-                        input_path=file_path,
-                        suitecrm_root=suitecrm_root,
-                        no_php_lint=bool(args.no_php_lint),
-                    )
-                    append_validation_run(
-                        run_log_path=run_log_path,
-                        run_id=run_id,
-                        input_path=file_path,
-                        suitecrm_root=suitecrm_root,
-                        report=report,
-                        findings=findings,
+                validation_targets.extend(written_files)
+
+            # All targets share one `php -l` process where PHP supports it. Records
+            # keep target order and are appended after the generation record in one write.
+            records: list[dict[str, Any]] = [log_payload]
+            if validation_targets:
+                validations = validate_files(
+                    validation_targets,
+                    suitecrm_root,
+                    no_php_lint=bool(args.no_php_lint),
+                )
+                for file_path, (report, findings) in zip(validation_targets, validations):
+                    records.append(
+                        validation_run_record(
+                            run_id=run_id,
+                            input_path=file_path,
+                            suitecrm_root=suitecrm_root,
+                            report=report,
+                            findings=findings,
+                        )
                     )
 
+            append_jsonl_records(run_log_path, records)
+
         return run_id, output_path, written_files, elapsed
 
+    base_run_id = (args.run_id or "").strip()
+    base_output_path = Path(args.output).resolve()
+    jobs: list[tuple[str, str, str, Path]] = []
+    for index, (prompt_path, prompt_text) in enumerate(zip(args.prompt, prompt_texts)):
+        if index == 0:
+            run_id = base_run_id or str(uuid.uuid4())
+            text_output_path = base_output_path
+        else:
+            run_id = f"{base_run_id}.p{index}" if base_run_id else str(uuid.uuid4())
+            text_output_path = base_output_path.with_name(
+                f"{base_output_path.stem}.p{index}{base_output_path.suffix}"
+            )
+        jobs.append((prompt_path, prompt_text, run_id, text_output_path))
+
+    workers = min(max(1, int(args.concurrency)), len(jobs))
+    if args.stream_echo and workers > 1:
+        print("Note: --stream-echo is ignored with more than one concurrent prompt.", file=sys.stderr)
+    started = perf_counter()
     try:
-        run_id, output_path, written_files, elapsed = run_one()
+        if workers > 1:
+            # The client (and its connection pool) is shared across threads; each
+            # job writes its own output files and appends its run log records in one write.
+            # Deltas are not echoed here: several streams would interleave on stderr.
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda job: run_one(*job), jobs))
+        else:
+            results = [run_one(*job, stream_echo=bool(args.stream_echo)) for job in jobs]
     except Exception as exc:  # pragma: no cover - CLI diagnostics
         message = str(exc)
         if "DeploymentNotFound" in message or "deployment for this resource does not exist" in message:
@@ -1115,13 +1924,15 @@ def main() -> int:
                 "(not the model name), then set AZURE_OPENAI_DEPLOYMENT to that value."
             ) from exc
         raise
-    if args.output_mode == OUTPUT_MODE_MODULE:
-        print(f"Generated module files: {len(written_files or [])}")
-    else:
-        print(f"Generated code saved to {output_path}")
-    if args.print_run_id:
-        print(f"run_id: {run_id}")
-    print(f"Execution time: {elapsed:.2f}s")
+    for run_id, output_path, written_files, _elapsed in results:
+        if args.output_mode == OUTPUT_MODE_MODULE:
+            print(f"Generated module files: {len(written_files or [])}")
+        else:
+            print(f"Generated code saved to {output_path}")
+        if args.print_run_id:
+            print(f"run_id: {run_id}")
+    # Wall time of the whole batch; concurrent jobs overlap, so their own times do not add up.
+    print(f"Execution time: {perf_counter() - started:.2f}s")
     return 0
 
 
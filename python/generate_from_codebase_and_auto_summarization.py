@@ -14,31 +14,24 @@ For the *first* approach (full context prompting without summarization), use:
 from __future__ import annotations
 
 import argparse
+import heapq
 import json
 import os
 import re
-import textwrap
+import sys
 import uuid
-from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from time import perf_counter
-from typing import Any, Iterator
+from typing import Any, Iterable
 
-try:  # pragma: no cover
-    from openai import AzureOpenAI
+try:  # pragma: no cover - optional, faster JSON for summaries
+    import orjson
 except ModuleNotFoundError:  # pragma: no cover
-    AzureOpenAI = None  # type: ignore
+    orjson = None  # type: ignore
 
-try:  # pragma: no cover
-    from dotenv import load_dotenv
-except ModuleNotFoundError:  # pragma: no cover
-    load_dotenv = None  # type: ignore
-
-try:  # pragma: no cover
-    from validate_generated_output import append_validation_run, validate_file
-except Exception:  # pragma: no cover
-    append_validation_run = None  # type: ignore
-    validate_file = None  # type: ignore
+# openai, dotenv and the validator are imported in main() where they are used,
+# so `--help` and argument errors do not pay for loading the SDK.
 
 # Reuse the non-autosummary core utilities from the raw script.
 from generate_from_codebase import (  # noqa: E402
@@ -47,26 +40,37 @@ from generate_from_codebase import (  # noqa: E402
     FILE_BUNDLE_INSTRUCTIONS,
     OUTPUT_MODE_MODULE,
     OUTPUT_MODE_TEXT,
-    SUPPORTED_EXTENSIONS,
-    append_jsonl,
+    append_jsonl_records,
+    build_messages,
     build_patch_from_function_output,
+    create_http_client,
+    decode_text_prefix,
     default_suitecrm_root,
+    echo_stream_delta,
+    gather_context,
     infer_target_function_name,
+    iter_hunk_count_normalized_lines,
+    load_cached_response,
+    iter_source_files,
     load_dotenv_fallback,
     load_text,
     looks_like_unified_diff,
     normalize_azure_endpoint,
-    normalize_unified_diff_hunk_counts,
     parse_file_bundle,
     prefer_deployment_from_dotenv,
     repair_file_bundle_json,
+    response_cache_key,
     run_chat_completion,
+    store_cached_response,
     strip_markdown_fences,
     suitecrm_modules_root,
     utc_now_iso,
     write_module_files,
 )
 
+SUMMARY_STRATEGY_MODULES = "modules"
+SUMMARY_STRATEGY_TREE = "tree"
+
 SUMMARY_SYSTEM_PROMPT = (
     "You are an assistant that summarizes a codebase for downstream code generation. "
     "Produce a semantic, hierarchical summary capturing module purpose, dependencies, key entities, and constraints. "
@@ -179,6 +183,43 @@ def parse_args() -> argparse.Namespace:
         default=900,
         help="(autosummary) Max tokens per module summarization call.",
     )
+    parser.add_argument(
+        "--summary-strategy",
+        choices=[SUMMARY_STRATEGY_MODULES, SUMMARY_STRATEGY_TREE],
+        default=os.getenv("AUTOSUMMARY_STRATEGY", SUMMARY_STRATEGY_MODULES),
+        help=(
+            "(autosummary) 'modules' summarizes each module separately; 'tree' summarizes directories "
+            "bottom-up from their children's abstracts, deferring subtrees below --summary-compression-depth."
+        ),
+    )
+    parser.add_argument(
+        "--summary-compression-depth",
+        type=int,
+        default=int(os.getenv("AUTOSUMMARY_COMPRESSION_DEPTH", "2")),
+        help="(autosummary, strategy=tree) Directory levels below the sources' common root that are summarized.",
+    )
+    parser.add_argument(
+        "--stream-echo",
+        action="store_true",
+        help="Echo the generated code to stderr while it streams in; the output is written once it completes.",
+    )
+    parser.add_argument(
+        "--no-summary-cache",
+        action="store_true",
+        help="(autosummary) Always call Azure OpenAI instead of reusing cached summaries (only cached at temperature 0).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=float(os.getenv("LLMCODEGEN_CACHE_TTL", "0")),
+        help="Maximum age in seconds of a reusable cached summary (0 = no expiry).",
+    )
+    parser.add_argument(
+        "--summary-concurrency",
+        type=int,
+        default=int(os.getenv("AUTOSUMMARY_CONCURRENCY", "8")),
+        help="(autosummary) Number of module summarization calls to run at once (1 = one after another).",
+    )
     parser.add_argument(
         "--temperature",
         type=float,
@@ -211,6 +252,18 @@ def parse_args() -> argparse.Namespace:
         default=os.getenv("AZURE_OPENAI_API_VERSION", DEFAULT_API_VERSION),
         help="Azure OpenAI API version.",
     )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "2")),
+        help="Retries (with exponential backoff) on connection errors, timeouts, 429 and 5xx responses.",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=float(os.getenv("AZURE_OPENAI_REQUEST_TIMEOUT", "60")),
+        help="Seconds to wait for each response read (each chunk while streaming) before retrying.",
+    )
     parser.add_argument(
         "--system",
         default=os.getenv("AZURE_OPENAI_SYSTEM_PROMPT", DEFAULT_SYSTEM_PROMPT),
@@ -219,35 +272,6 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def _safe_read_text(path: Path) -> str:
-    try:
-        return path.read_text(encoding="utf-8")
-    except UnicodeDecodeError:
-        return path.read_text(encoding="latin-1", errors="replace")
-
-
-def iter_source_files(paths: list[str], *, base_root: Path | None = None) -> Iterator[Path]:
-    """Yield source files from provided paths.
-
-    If a path does not exist relative to the current working directory, and a
-    base_root is provided, we also try resolving it relative to base_root.
-    """
-
-    for raw in paths:
-        candidate = Path(raw)
-        if not candidate.is_absolute() and not candidate.exists() and base_root is not None:
-            alt = (base_root / candidate).resolve()
-            if alt.exists():
-                candidate = alt
-
-        if candidate.is_dir():
-            for file_path in sorted(candidate.rglob("*")):
-                if file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                    yield file_path.resolve()
-        elif candidate.is_file() and candidate.suffix.lower() in SUPPORTED_EXTENSIONS:
-            yield candidate.resolve()
-
-
 def _suitecrm_relative_path(file_path: Path, suitecrm_root: Path) -> Path:
     try:
         return file_path.resolve().relative_to(suitecrm_root.resolve())
@@ -267,62 +291,213 @@ def derive_module_name(file_path: Path, suitecrm_root: Path) -> str:
     return "(root)"
 
 
-def extract_dependency_hints(source_text: str) -> dict[str, list[str]]:
-    includes: list[str] = []
-    uses: list[str] = []
-
-    for match in re.finditer(
-        r"\b(?:require_once|require|include_once|include)\s*\(?\s*['\"]([^'\"]+)['\"]",
-        source_text,
-    ):
-        dep = match.group(1).strip()
-        if dep:
-            includes.append(dep)
-
-    for match in re.finditer(r"\buse\s+([A-Za-z0-9_\\\\]+)\s*;", source_text):
-        sym = match.group(1).strip()
-        if sym:
-            uses.append(sym)
+# Dependency hints are taken from at most this many leading bytes of a file;
+# require/include/use statements sit near the top of PHP files.
+DEPENDENCY_HINT_SCAN_BYTES = 256 * 1024
+# Threads reading upcoming modules' files while earlier summarization calls run.
+SUMMARY_PREFETCH_WORKERS = 2
+
+# require/include paths (group 1) and `use` imports (group 2) in a single scan.
+_DEPENDENCY_RE = re.compile(
+    r"\b(?:(?:require|include)(?:_once)?\s*\(?\s*['\"]([^'\"]+)['\"]|use\s+([A-Za-z0-9_\\]+)\s*;)"
+)
 
+
+def collect_dependency_hints(source_texts: Iterable[str], limit: int = 80) -> dict[str, list[str]]:
+    """Merge the include/use hints of several files into one sorted, capped set."""
+
+    includes: set[str] = set()
+    uses: set[str] = set()
+    for source_text in source_texts:
+        # Files are scanned one by one: a truncated prefix may end inside a quoted
+        # path, and a joined scan would let that match run into the next file.
+        for dep, sym in _DEPENDENCY_RE.findall(source_text):
+            if dep:
+                includes.add(dep.strip())
+            else:
+                uses.add(sym.strip())
+    includes.discard("")
+    uses.discard("")
+
+    # Only the first `limit` names are kept, so select them instead of sorting the
+    # whole set (generated metadata can carry thousands of `use` lines).
     return {
-        "includes": sorted(set(includes))[:50],
-        "uses": sorted(set(uses))[:50],
+        "includes": heapq.nsmallest(limit, includes),
+        "uses": heapq.nsmallest(limit, uses),
     }
 
 
-def gather_context(paths: list[str], byte_budget: int, *, base_root: Path | None = None) -> str:
-    if not paths or byte_budget <= 0:
-        return ""
+def extract_dependency_hints(source_text: str) -> dict[str, list[str]]:
+    return collect_dependency_hints((source_text,), limit=50)
+
+
+MODULE_SUMMARY_SCHEMA: dict[str, Any] = {
+    "module": {"name": "", "purpose": ""},
+    "dependencies": {"includes": [], "uses": [], "other_modules": []},
+    "entities": [
+        {
+            "kind": "class|function|interface|trait|file",
+            "name": "",
+            "description": "",
+            "inputs": [],
+            "outputs": [],
+            "side_effects": [],
+        }
+    ],
+    "business_logic": [],
+    "constraints": [],
+}
+
+TREE_NODE_SUMMARY_SCHEMA: dict[str, Any] = {
+    "node": {"path": "", "abstract": ""},
+    "dependencies": MODULE_SUMMARY_SCHEMA["dependencies"],
+    "entities": MODULE_SUMMARY_SCHEMA["entities"],
+    "business_logic": [],
+    "constraints": [],
+}
+
+TREE_NODE_USER_PROMPT = (
+    "This is one directory of a bottom-up summary tree. Describe the directory's own files, "
+    "and fold the child directory abstracts into a short abstract of the whole directory "
+    "(keep child details out unless they matter at this level)."
+)
+
 
-    snippets: list[str] = []
-    remaining = byte_budget
+def _read_summary_inputs(
+    files: list[Path], suitecrm_root: Path, budget_bytes: int
+) -> tuple[list[str], dict[str, list[str]], str]:
+    """Return (relative file names, dependency hints, code context) for one summarization call."""
+
+    rel_files = [str(_suitecrm_relative_path(p, suitecrm_root)).replace("\\", "/") for p in files]
+
+    # Each file is read once, and only as far as needed: the hints scan a capped
+    # prefix and the context below takes its budgeted prefix from the same bytes.
+    read_limit = max(DEPENDENCY_HINT_SCAN_BYTES, budget_bytes)
+    file_bytes: list[bytes] = []
+    for p in files:
+        with p.open("rb") as handle:
+            file_bytes.append(handle.read(read_limit))
+    dep_hints = collect_dependency_hints(decode_text_prefix(data[:DEPENDENCY_HINT_SCAN_BYTES]) for data in file_bytes)
+
+    context_snippets: list[str] = []
+    remaining = budget_bytes
+    for p, data in zip(files, file_bytes):
+        prefix = data[:remaining]
+        chunk, consumed = decode_text_prefix(prefix), len(prefix)
+        context_snippets.append(f"// file: {_suitecrm_relative_path(p, suitecrm_root)}\n{chunk}".rstrip())
+        remaining -= consumed
+        if remaining <= 0:
+            break
 
-    for file_path in iter_source_files(paths, base_root=base_root):
-        text = _safe_read_text(file_path)
-        encoded = text.encode("utf-8")
-        chunk = encoded[:remaining].decode("utf-8", errors="ignore")
+    return rel_files, dep_hints, "\n\n".join(context_snippets)
 
-        display_path: str
-        if base_root is not None:
-            try:
-                display_path = str(file_path.relative_to(base_root))
-            except Exception:
-                display_path = str(file_path)
-        else:
-            display_path = str(file_path)
 
-        snippets.append(
-            textwrap.dedent(
-                f"""// file: {display_path}
-{chunk}
-"""
-            ).strip()
+def _prefetch_summary_inputs(
+    executor: ThreadPoolExecutor,
+    groups: list[tuple[Any, list[Path]]],
+    suitecrm_root: Path,
+    budget_bytes: int,
+) -> dict[Any, Future]:
+    """Start `_read_summary_inputs` for each (key, files) group, in processing order.
+
+    The reads run on `executor` while earlier groups wait on the API, so a
+    summarization call finds its inputs ready instead of hitting the disk first.
+    """
+
+    return {key: executor.submit(_read_summary_inputs, files, suitecrm_root, budget_bytes) for key, files in groups}
+
+
+def _run_summary_call(
+    *,
+    client: Any,
+    deployment: str,
+    user_content: str,
+    temperature: float,
+    max_tokens: int,
+    fallback: dict[str, Any],
+    api_version: str,
+    cache_ttl: float | None,
+) -> tuple[dict[str, Any], Any, int | None, Any, bool]:
+    """Run one JSON-mode summarization call; unparseable output is kept under `raw_text`.
+
+    With a `cache_ttl` (0 = no expiry), deterministic calls go through the
+    response cache of generate_from_codebase.py. The request carries the file
+    bytes, hints and child abstracts the summary is built from, so unchanged
+    modules (and tree nodes over unchanged subtrees) are not sent again. The
+    last element of the result says whether the cache answered.
+    """
+
+    messages: list[Any] = [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": user_content},
+    ]
+    response_format = {"type": "json_object"}
+
+    cache_key: str | None = None
+    if cache_ttl is not None and float(temperature) == 0.0:
+        cache_key = response_cache_key(
+            deployment=deployment,
+            api_version=api_version,
+            messages=messages,
+            temperature=float(temperature),
+            max_tokens=int(max_tokens),
+            response_format=response_format,
+            n=1,
         )
-        remaining -= len(chunk.encode("utf-8"))
-        if remaining <= 0:
-            break
 
-    return "\n\n".join(snippets)
+    cached = load_cached_response(cache_key, cache_ttl) if cache_key else None
+    if cached is not None:
+        outputs, finish_reasons, accepted, usage, _ = cached
+        text, finish = outputs[0], finish_reasons[0]
+    else:
+        text, finish, accepted, usage, elapsed = run_chat_completion(
+            client=client,
+            deployment=deployment,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format=response_format,
+        )
+        if cache_key and (text or "").strip():
+            store_cached_response(cache_key, outputs=[text], finish_reasons=[finish], usage=usage, elapsed=elapsed)
+
+    try:
+        stripped = (text or "").strip()
+        summary = orjson.loads(stripped) if orjson is not None else json.loads(stripped)
+    except Exception:
+        summary = None
+    if not isinstance(summary, dict):
+        summary = {**fallback, "raw_text": (text or "").strip()}
+
+    return summary, finish, accepted, usage, cached is not None
+
+
+def _dumps_summary(aggregate: dict[str, Any]) -> str:
+    # Same text as json.dumps(aggregate, ensure_ascii=False, indent=2); the aggregate
+    # embeds every module summary, so it is the one large document built per run.
+    if orjson is not None:
+        return orjson.dumps(aggregate, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(aggregate, ensure_ascii=False, indent=2)
+
+
+def _add_usage(aggregated_usage: dict[str, int], usage: Any, cache_hit: bool) -> None:
+    # A cached summary spent no tokens in this run; its stored usage is from the run that made it.
+    if cache_hit:
+        aggregated_usage["cache_hits"] += 1
+    elif usage is not None:
+        aggregated_usage["prompt_tokens"] += int(getattr(usage, "prompt_tokens", 0) or 0)
+        aggregated_usage["completion_tokens"] += int(getattr(usage, "completion_tokens", 0) or 0)
+        aggregated_usage["total_tokens"] += int(getattr(usage, "total_tokens", 0) or 0)
+
+
+def _map_in_order(func: Any, items: list[Any], concurrency: int) -> list[Any]:
+    # Summarization calls are independent, so they can run concurrently on the shared
+    # client; results come back in item order to keep the aggregate deterministic.
+    workers = min(max(1, int(concurrency)), len(items))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, items))
+    return [func(item) for item in items]
 
 
 def summarize_modules_hierarchical(
@@ -334,6 +509,9 @@ def summarize_modules_hierarchical(
     total_context_budget_bytes: int,
     temperature: float,
     max_tokens: int,
+    concurrency: int = 1,
+    api_version: str = DEFAULT_API_VERSION,
+    cache_ttl: float | None = None,
 ) -> tuple[str, Any, int | None, dict[str, int], float]:
     start = perf_counter()
 
@@ -351,101 +529,49 @@ def summarize_modules_hierarchical(
     per_module_budget = max(2_000, int(total_context_budget_bytes / max(1, len(ordered_modules))))
 
     module_summaries: list[dict[str, Any]] = []
-    aggregated_usage: dict[str, int] = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    aggregated_usage: dict[str, int] = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cache_hits": 0}
     accepted_prediction_tokens: int | None = None
     finish_reason: Any = None
 
-    schema_example = {
-        "module": {"name": "", "purpose": ""},
-        "dependencies": {"includes": [], "uses": [], "other_modules": []},
-        "entities": [
-            {
-                "kind": "class|function|interface|trait|file",
-                "name": "",
-                "description": "",
-                "inputs": [],
-                "outputs": [],
-                "side_effects": [],
-            }
-        ],
-        "business_logic": [],
-        "constraints": [],
-    }
+    io_executor = ThreadPoolExecutor(max_workers=SUMMARY_PREFETCH_WORKERS)
+    pending_inputs = _prefetch_summary_inputs(
+        io_executor,
+        [(name, sorted(files, key=lambda p: str(p))[:max_files_per_module]) for name, files in ordered_modules],
+        suitecrm_root,
+        per_module_budget,
+    )
 
-    for module_name, files in ordered_modules:
-        files = sorted(files, key=lambda p: str(p))[:max_files_per_module]
-
-        dep_hints: dict[str, Any] = {"includes": [], "uses": []}
-        rel_files = [str(_suitecrm_relative_path(p, suitecrm_root)).replace("\\", "/") for p in files]
-
-        for p in files:
-            hints = extract_dependency_hints(_safe_read_text(p))
-            dep_hints["includes"].extend(hints.get("includes", []))
-            dep_hints["uses"].extend(hints.get("uses", []))
-        dep_hints["includes"] = sorted(set(dep_hints["includes"]))[:80]
-        dep_hints["uses"] = sorted(set(dep_hints["uses"]))[:80]
-
-        context_snippets: list[str] = []
-        remaining = per_module_budget
-        for p in files:
-            text = _safe_read_text(p)
-            encoded = text.encode("utf-8")
-            chunk = encoded[:remaining].decode("utf-8", errors="ignore")
-            context_snippets.append(
-                textwrap.dedent(
-                    f"""// file: {_suitecrm_relative_path(p, suitecrm_root)}
-{chunk}
-"""
-                ).strip()
-            )
-            remaining -= len(chunk.encode("utf-8"))
-            if remaining <= 0:
-                break
-
-        module_context = "\n\n".join(context_snippets)
-
-        messages: list[Any] = [
-            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
-            {
-                "role": "user",
-                "content": (
-                    f"{SUMMARY_USER_PROMPT}\n\n"
-                    "Output must be a SINGLE JSON object.\n"
-                    "Schema example (fill with real content):\n"
-                    f"{json.dumps(schema_example, ensure_ascii=False)}\n\n"
-                    f"Module name: {module_name}\n"
-                    f"Files: {json.dumps(rel_files, ensure_ascii=False)}\n"
-                    f"Dependency hints: {json.dumps(dep_hints, ensure_ascii=False)}\n\n"
-                    f"Code context:\n{module_context}"
-                ),
-            },
-        ]
+    def summarize_one(item: tuple[str, list[Path]]) -> tuple[dict[str, Any], Any, int | None, Any, bool]:
+        module_name = item[0]
+        rel_files, dep_hints, module_context = pending_inputs[module_name].result()
 
-        module_text, module_finish, module_accepted, module_usage, _ = run_chat_completion(
+        return _run_summary_call(
             client=client,
             deployment=deployment,
-            messages=messages,
+            user_content=(
+                f"{SUMMARY_USER_PROMPT}\n\n"
+                "Output must be a SINGLE JSON object.\n"
+                "Schema example (fill with real content):\n"
+                f"{json.dumps(MODULE_SUMMARY_SCHEMA, ensure_ascii=False)}\n\n"
+                f"Module name: {module_name}\n"
+                f"Files: {json.dumps(rel_files, ensure_ascii=False)}\n"
+                f"Dependency hints: {json.dumps(dep_hints, ensure_ascii=False)}\n\n"
+                f"Code context:\n{module_context}"
+            ),
             temperature=temperature,
             max_tokens=max_tokens,
-            response_format={"type": "json_object"},
+            fallback={"module": {"name": module_name, "purpose": "(unparsed)"}},
+            api_version=api_version,
+            cache_ttl=cache_ttl,
         )
 
+    with io_executor:
+        results = _map_in_order(summarize_one, ordered_modules, concurrency)
+
+    for module_json, module_finish, module_accepted, module_usage, cache_hit in results:
         finish_reason = module_finish
         accepted_prediction_tokens = module_accepted
-
-        try:
-            module_json = json.loads((module_text or "").strip())
-        except Exception:
-            module_json = {
-                "module": {"name": module_name, "purpose": "(unparsed)"},
-                "raw_text": (module_text or "").strip(),
-            }
-
-        if module_usage is not None:
-            aggregated_usage["prompt_tokens"] += int(getattr(module_usage, "prompt_tokens", 0) or 0)
-            aggregated_usage["completion_tokens"] += int(getattr(module_usage, "completion_tokens", 0) or 0)
-            aggregated_usage["total_tokens"] += int(getattr(module_usage, "total_tokens", 0) or 0)
-
+        _add_usage(aggregated_usage, module_usage, cache_hit)
         module_summaries.append(module_json)
 
     aggregate = {
@@ -465,27 +591,185 @@ def summarize_modules_hierarchical(
     }
 
     elapsed = perf_counter() - start
-    summary_text = json.dumps(aggregate, ensure_ascii=False, indent=2)
+    summary_text = _dumps_summary(aggregate)
     return summary_text, finish_reason, accepted_prediction_tokens, aggregated_usage, elapsed
 
 
-def build_messages(system_prompt: str, prompt: str, context: str) -> list[Any]:
-    if context:
-        user_prompt = f"Context:\n{context}\n\nTask:\n{prompt.strip()}"
-    else:
-        user_prompt = prompt.strip()
+def summarize_tree_hierarchical(
+    *,
+    client: Any,
+    deployment: str,
+    source_files: list[Path],
+    suitecrm_root: Path,
+    total_context_budget_bytes: int,
+    temperature: float,
+    max_tokens: int,
+    compression_depth: int = 2,
+    concurrency: int = 1,
+    api_version: str = DEFAULT_API_VERSION,
+    cache_ttl: float | None = None,
+) -> tuple[str, Any, int | None, dict[str, int], float]:
+    """Summarize the source directories bottom-up (HCAG-style) instead of per module.
+
+    Directories are nodes of a tree rooted at the common parent of the sources.
+    Nodes up to `compression_depth` levels below the root get one call each that
+    sees the node's own files plus the *abstracts* of its child nodes (never their
+    code), so each level is summarized from compact JSON. Deeper subtrees are not
+    read at all; they appear as `{"abstract": "to be detailed", "content_ref": ...}`
+    placeholders. A node without files of its own and a single child reuses the
+    child's summary instead of making a call.
+    """
 
-    return [
-        {"role": "system", "content": system_prompt.strip()},
-        {"role": "user", "content": user_prompt},
-    ]
+    start = perf_counter()
+
+    max_nodes = int(os.getenv("AUTOSUMMARY_MAX_NODES", "16"))
+    max_files_per_node = int(os.getenv("AUTOSUMMARY_MAX_FILES_PER_MODULE", "8"))
+
+    aggregated_usage: dict[str, int] = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cache_hits": 0}
+    accepted_prediction_tokens: int | None = None
+    finish_reason: Any = None
+
+    base = Path(os.path.commonpath([str(p.parent) for p in source_files])) if source_files else suitecrm_root
+    node_files: dict[tuple[str, ...], list[Path]] = {(): []}
+    node_children: dict[tuple[str, ...], set[tuple[str, ...]]] = {(): set()}
+    for file_path in source_files:
+        parts = file_path.parent.relative_to(base).parts
+        for depth in range(1, len(parts) + 1):
+            key = parts[:depth]
+            if key not in node_files:
+                node_files[key] = []
+                node_children[key] = set()
+                node_children[parts[: depth - 1]].add(key)
+        node_files[parts].append(file_path)
+
+    # Stay within the call budget by deferring more of the tree.
+    depth_limit = max(0, int(compression_depth))
+    while depth_limit > 0 and sum(1 for key in node_files if len(key) <= depth_limit) > max_nodes:
+        depth_limit -= 1
+
+    def node_path(key: tuple[str, ...]) -> str:
+        return str(_suitecrm_relative_path(base.joinpath(*key), suitecrm_root)).replace("\\", "/")
+
+    summarized_count = sum(1 for key in node_files if len(key) <= depth_limit and node_files[key])
+    per_node_budget = max(2_000, int(total_context_budget_bytes / max(1, summarized_count)))
+
+    node_summaries: dict[tuple[str, ...], dict[str, Any]] = {}
+
+    def child_entries(key: tuple[str, ...]) -> list[dict[str, Any]]:
+        entries: list[dict[str, Any]] = []
+        for child in sorted(node_children[key]):
+            if child in node_summaries:
+                entries.append(node_summaries[child])
+            else:
+                ref = node_path(child)
+                entries.append({"node": {"path": ref, "abstract": "to be detailed"}, "content_ref": ref})
+        return entries
+
+    def child_abstract(child: tuple[str, ...], entry: dict[str, Any]) -> dict[str, Any]:
+        node = entry.get("node") if isinstance(entry.get("node"), dict) else {}
+        return {"path": node_path(child), "abstract": node.get("abstract") or str(entry.get("raw_text") or "")[:500]}
+
+    def summarize_node(key: tuple[str, ...]) -> tuple[dict[str, Any], Any, int | None, Any, bool] | None:
+        children = child_entries(key)
+        if not node_files[key] and (not children or (len(children) == 1 and "content_ref" not in children[0])):
+            return None
+
+        rel_files, dep_hints, node_context = pending_inputs[key].result()
+        path = node_path(key)
+        abstracts = [child_abstract(child, entry) for child, entry in zip(sorted(node_children[key]), children)]
+
+        summary, finish, accepted, usage, cache_hit = _run_summary_call(
+            client=client,
+            deployment=deployment,
+            user_content=(
+                f"{SUMMARY_USER_PROMPT}\n{TREE_NODE_USER_PROMPT}\n\n"
+                "Output must be a SINGLE JSON object.\n"
+                "Schema example (fill with real content):\n"
+                f"{json.dumps(TREE_NODE_SUMMARY_SCHEMA, ensure_ascii=False)}\n\n"
+                f"Directory: {path}\n"
+                f"Files: {json.dumps(rel_files, ensure_ascii=False)}\n"
+                f"Dependency hints: {json.dumps(dep_hints, ensure_ascii=False)}\n"
+                f"Child directories: {json.dumps(abstracts, ensure_ascii=False)}\n\n"
+                f"Code context:\n{node_context}"
+            ),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            fallback={"node": {"path": path, "abstract": "(unparsed)"}},
+            api_version=api_version,
+            cache_ttl=cache_ttl,
+        )
+        summary["children"] = children
+        return summary, finish, accepted, usage, cache_hit
+
+    # Bottom-up, one level at a time: a level only needs its children's summaries.
+    levels = [sorted(key for key in node_files if len(key) == depth) for depth in range(depth_limit, -1, -1)]
+    io_executor = ThreadPoolExecutor(max_workers=SUMMARY_PREFETCH_WORKERS)
+    pending_inputs = _prefetch_summary_inputs(
+        io_executor,
+        [
+            (key, sorted(node_files[key], key=lambda p: str(p))[:max_files_per_node])
+            for level in levels
+            for key in level
+        ],
+        suitecrm_root,
+        per_node_budget,
+    )
+
+    call_count = 0
+    with io_executor:
+        for level in levels:
+            for key, result in zip(level, _map_in_order(summarize_node, level, concurrency)):
+                if result is None:
+                    if node_children[key]:
+                        (only_child,) = node_children[key]
+                        node_summaries[key] = node_summaries[only_child]
+                    else:
+                        node_summaries[key] = {"node": {"path": node_path(key), "abstract": "(no source files)"}}
+                    continue
+                summary, finish_reason, accepted_prediction_tokens, usage, cache_hit = result
+                _add_usage(aggregated_usage, usage, cache_hit)
+                node_summaries[key] = summary
+                call_count += 1
+
+    aggregate = {
+        "project": {
+            "name": "SuiteCRM",
+            "generated_at_utc": utc_now_iso(),
+            "source_file_count": len(source_files),
+            "summarized_node_count": call_count,
+            "limits": {
+                "compression_depth": depth_limit,
+                "max_nodes": max_nodes,
+                "max_files_per_node": max_files_per_node,
+                "total_context_budget_bytes": int(total_context_budget_bytes),
+                "per_node_budget_bytes": int(per_node_budget),
+            },
+        },
+        "tree": node_summaries[()],
+    }
+
+    elapsed = perf_counter() - start
+    summary_text = _dumps_summary(aggregate)
+    return summary_text, finish_reason, accepted_prediction_tokens, aggregated_usage, elapsed
+
+
+def _load_validator() -> tuple[Any, Any]:
+    """Return (validation_run_record, validate_files), or (None, None) if unavailable."""
+
+    try:  # pragma: no cover - optional import for in-process validation
+        from validate_generated_output import validate_files, validation_run_record
+    except Exception:  # pragma: no cover
+        return None, None
+    return validation_run_record, validate_files
 
 
 def main() -> int:
-    if load_dotenv is not None:
-        load_dotenv()  # pragma: no cover
-    else:
+    try:  # pragma: no cover
+        from dotenv import load_dotenv
+    except ModuleNotFoundError:  # pragma: no cover
         load_dotenv_fallback()
+    else:
+        load_dotenv()  # pragma: no cover
 
     prefer_deployment_from_dotenv()
 
@@ -514,13 +798,21 @@ def main() -> int:
     if extra_chunks:
         extra_context_text = "\n\n".join(extra_chunks).strip()
 
-    if AzureOpenAI is None:
-        raise RuntimeError("The 'openai' package is required to call the Azure OpenAI API.")
+    try:  # pragma: no cover - optional dependency resolution
+        from openai import AzureOpenAI
+    except ModuleNotFoundError:  # pragma: no cover - helpful message at runtime
+        raise RuntimeError("The 'openai' package is required to call the Azure OpenAI API.") from None
 
     client = AzureOpenAI(
         api_key=args.api_key,
         azure_endpoint=args.endpoint,
         api_version=args.api_version,
+        # Summaries run up to --summary-concurrency calls at once on this client.
+        http_client=create_http_client(
+            float(args.request_timeout), max_connections=max(10, int(args.summary_concurrency))
+        ),
+        max_retries=max(0, int(args.max_retries)),
+        timeout=float(args.request_timeout),
     )
 
     run_id = (args.run_id or "").strip() or str(uuid.uuid4())
@@ -529,32 +821,50 @@ def main() -> int:
     suitecrm_root = Path(args.suitecrm_root).expanduser()
     if not suitecrm_root.is_absolute():
         suitecrm_root = (Path.cwd() / suitecrm_root).resolve()
-    source_files = list(iter_source_files(args.sources, base_root=suitecrm_root))
-
-    summary_text, summary_finish_reason, summary_accepted, summary_usage, summary_elapsed = summarize_modules_hierarchical(
-        client=client,
-        deployment=args.deployment,
-        source_files=source_files,
-        suitecrm_root=suitecrm_root,
-        total_context_budget_bytes=int(args.summary_max_context_bytes),
-        temperature=float(args.summary_temperature),
-        max_tokens=int(args.summary_max_tokens),
-    )
-
-    raw_context = gather_context(args.sources, int(args.max_context_bytes), base_root=suitecrm_root)
-    context_parts = ["Auto Summary (hierarchical JSON):\n" + (summary_text or "").strip()]
-    if raw_context.strip():
-        context_parts.append("Raw Context Snippets (reduced):\n" + raw_context)
-
-    context = "\n\n".join(context_parts).strip()
+    source_files = list(iter_source_files(args.sources, base_root=suitecrm_root, cache_listing=True))
+
+    summary_kwargs: dict[str, Any] = {
+        "client": client,
+        "deployment": args.deployment,
+        "source_files": source_files,
+        "suitecrm_root": suitecrm_root,
+        "total_context_budget_bytes": int(args.summary_max_context_bytes),
+        "temperature": float(args.summary_temperature),
+        "max_tokens": int(args.summary_max_tokens),
+        "concurrency": int(args.summary_concurrency),
+        "api_version": args.api_version,
+        "cache_ttl": None if args.no_summary_cache else float(args.cache_ttl),
+    }
+    if args.summary_strategy == SUMMARY_STRATEGY_TREE:
+        summary_result = summarize_tree_hierarchical(
+            **summary_kwargs, compression_depth=int(args.summary_compression_depth)
+        )
+    else:
+        summary_result = summarize_modules_hierarchical(**summary_kwargs)
+    summary_text, summary_finish_reason, summary_accepted, summary_usage, summary_elapsed = summary_result
+
+    # The summarizer already listed the sources; reuse that listing for the raw
+    # snippets, and skip the pass entirely when the run relies on the summary alone.
+    raw_context = ""
+    if int(args.max_context_bytes) > 0:
+        raw_context = gather_context(
+            args.sources, int(args.max_context_bytes), base_root=suitecrm_root, files=source_files
+        )
+    # The summary JSON is most of the context, so the parts are joined once
+    # instead of being concatenated (and copied) step by step.
+    context_parts: list[str] = []
     if extra_context_text:
-        context = (extra_context_text + "\n\n" + context).strip()
+        context_parts += [extra_context_text, "\n\n"]
+    context_parts += ["Auto Summary (hierarchical JSON):\n", (summary_text or "").strip()]
+    if raw_context.strip():
+        context_parts += ["\n\nRaw Context Snippets (reduced):\n", raw_context]
+    context = "".join(context_parts).strip()
 
-    effective_prompt = prompt_text
+    system_prompt = args.system
     if args.output_mode == OUTPUT_MODE_MODULE:
-        effective_prompt = f"{prompt_text.strip()}\n\n{FILE_BUNDLE_INSTRUCTIONS}"
+        system_prompt = f"{args.system.strip()}\n\n{FILE_BUNDLE_INSTRUCTIONS}"
 
-    messages = build_messages(args.system, effective_prompt, context)
+    messages = build_messages(system_prompt, prompt_text, context)
     response_format = {"type": "json_object"} if args.output_mode == OUTPUT_MODE_MODULE else None
 
     output_text, finish_reason, accepted_prediction_tokens, usage, elapsed = run_chat_completion(
@@ -564,7 +874,10 @@ def main() -> int:
         temperature=args.temperature,
         max_tokens=args.max_tokens,
         response_format=response_format,
+        on_delta=echo_stream_delta if args.stream_echo else None,
     )
+    if args.stream_echo:
+        sys.stderr.write("\n")
 
     output_text = strip_markdown_fences(output_text)
 
@@ -612,11 +925,21 @@ def main() -> int:
                 )
                 generated_locally = True
 
-        if not generated_locally:
-            normalized_output = normalize_unified_diff_hunk_counts(normalized_output)
-        if (normalized_output or "").strip() and not normalized_output.endswith("\n"):
-            normalized_output += "\n"
-        output_path.write_text(normalized_output, encoding="utf-8", newline="")
+        with output_path.open("w", encoding="utf-8", newline="", buffering=1 << 16) as handle:
+            if not generated_locally and normalized_output and "@@" in normalized_output:
+                # Recounted lines go straight to the file instead of being joined
+                # and then copied again to add the trailing newline.
+                line = ""
+                for index, line in enumerate(iter_hunk_count_normalized_lines(normalized_output)):
+                    if index:
+                        handle.write("\n")
+                    handle.write(line)
+                if line:
+                    handle.write("\n")
+            else:
+                handle.write(normalized_output)
+                if (normalized_output or "").strip() and not normalized_output.endswith("\n"):
+                    handle.write("\n")
 
     if (args.run_log or "").strip():
         run_log_path = Path(args.run_log).expanduser()
@@ -660,6 +983,9 @@ def main() -> int:
                 "max_context_bytes": int(args.summary_max_context_bytes),
                 "temperature": float(args.summary_temperature),
                 "max_tokens": int(args.summary_max_tokens),
+                "strategy": args.summary_strategy,
+                "cache_hits": summary_usage.get("cache_hits"),
+                "concurrency": int(args.summary_concurrency),
                 "usage": {
                     "prompt_tokens": summary_usage.get("prompt_tokens"),
                     "completion_tokens": summary_usage.get("completion_tokens"),
@@ -668,53 +994,50 @@ def main() -> int:
             },
         }
 
-        append_jsonl(run_log_path, log_payload)
+        suitecrm_root_path = Path(args.suitecrm_root).expanduser()
+        if not suitecrm_root_path.is_absolute():
+            suitecrm_root_path = (Path.cwd() / suitecrm_root_path).resolve()
+
+        # Text mode validates the single output file; module mode validates each written file.
+        validation_targets: list[Path] = []
+        validation_run_record, validate_files = (None, None)
+        if (args.validate and output_path is not None) or (
+            args.output_mode == OUTPUT_MODE_MODULE and args.validate_written and written_files
+        ):
+            validation_run_record, validate_files = _load_validator()
 
         if args.validate and output_path is not None:
-            if validate_file is None or append_validation_run is None:
+            if validate_files is None or validation_run_record is None:
                 raise RuntimeError("Validation requested but validator helpers could not be imported.")
-
-            suitecrm_root_path = Path(args.suitecrm_root).expanduser()
-            if not suitecrm_root_path.is_absolute():
-                suitecrm_root_path = (Path.cwd() / suitecrm_root_path).resolve()
-
-            report, findings = validate_file(
-                input_path=output_path,
-                suitecrm_root=suitecrm_root_path,
-                no_php_lint=bool(args.no_php_lint),
-            )
-            append_validation_run(
-                run_log_path=run_log_path,
-                run_id=run_id,
-                input_path=output_path,
-                suitecrm_root=suitecrm_root_path,
-                report=report,
-                findings=findings,
-            )
+            validation_targets.append(output_path)
 
         if args.output_mode == OUTPUT_MODE_MODULE and args.validate_written and written_files:
-            if validate_file is None or append_validation_run is None:
+            if validate_files is None or validation_run_record is None:
                 raise RuntimeError("--validate-written requested but validator helpers could not be imported.")
-
-            suitecrm_root_path = Path(args.suitecrm_root).expanduser()
-            if not suitecrm_root_path.is_absolute():
-                suitecrm_root_path = (Path.cwd() / suitecrm_root_path).resolve()
-
-            for file_path in written_files:
-                report, findings = validate_file(
-                    input_path=file_path,
-                    suitecrm_root=suitecrm_root_path,
-                    no_php_lint=bool(args.no_php_lint),
-                )
-                append_validation_run(
-                    run_log_path=run_log_path,
-                    run_id=run_id,
-                    input_path=file_path,
-                    suitecrm_root=suitecrm_root_path,
-                    report=report,
-                    findings=findings,
+            validation_targets.extend(written_files)
+
+        # One `php -l` process lints all targets where PHP supports it, and the
+        # generation and validation records are appended to the run log in one write.
+        records: list[dict[str, Any]] = [log_payload]
+        if validation_targets:
+            validations = validate_files(
+                validation_targets,
+                suitecrm_root_path,
+                no_php_lint=bool(args.no_php_lint),
+            )
+            for file_path, (report, findings) in zip(validation_targets, validations):
+                records.append(
+                    validation_run_record(
+                        run_id=run_id,
+                        input_path=file_path,
+                        suitecrm_root=suitecrm_root_path,
+                        report=report,
+                        findings=findings,
+                    )
                 )
 
+        append_jsonl_records(run_log_path, records)
+
     if args.output_mode == OUTPUT_MODE_MODULE:
         print(f"Generated module files: {len(written_files or [])}")
     else:
@@ -24,6 +24,24 @@ try:  # pragma: no cover
 except ModuleNotFoundError:  # pragma: no cover
     load_dotenv = None  # type: ignore
 
+try:  # pragma: no cover - optional, faster JSON encoding
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+# .env parsing, source walking, response cache, prefix reads and run-log writes are shared with
+# generate_from_codebase.py.
+from generate_from_codebase import (  # noqa: E402
+    _load_dotenv_file,
+    _walk_source_files,
+    append_jsonl,
+    create_http_client,
+    iter_file_prefixes,
+    load_cached_response,
+    response_cache_key,
+    store_cached_response,
+)
+
 DEFAULT_PROMPT = (
     "You are preparing a concise architectural summary for SuiteCRM modules. "
     "Describe each module's purpose, dependencies, key classes or functions, business rules, and potential risks."
@@ -40,18 +58,9 @@ def _dotenv_candidates() -> list[Path]:
 
 def _read_dotenv_value(key: str) -> str | None:
     for env_path in _dotenv_candidates():
-        if not env_path.exists() or not env_path.is_file():
-            continue
-        for raw_line in env_path.read_text(encoding="utf-8", errors="replace").splitlines():
-            line = raw_line.strip()
-            if not line or line.startswith("#") or "=" not in line:
-                continue
-            k, v = line.split("=", 1)
-            k = k.strip()
-            if k != key:
-                continue
-            value = v.strip().strip('"').strip("'")
-            return value if value else None
+        values = _load_dotenv_file(env_path)
+        if key in values:
+            return values[key] or None
     return None
 
 
@@ -86,16 +95,8 @@ def load_dotenv_fallback() -> None:
     for env_path in candidates:
         if not env_path.exists() or not env_path.is_file():
             continue
-        for raw_line in env_path.read_text(encoding="utf-8", errors="replace").splitlines():
-            line = raw_line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" not in line:
-                continue
-            key, value = line.split("=", 1)
-            key = key.strip()
-            value = value.strip().strip('"').strip("'")
-            if key and key not in os.environ:
+        for key, value in _load_dotenv_file(env_path).items():
+            if key not in os.environ:
                 os.environ[key] = value
         return
 
@@ -115,7 +116,7 @@ def run_summary_completion(
     messages: list[Any],
     temperature: float,
     max_tokens: int,
-) -> tuple[str, Any, int | None, float]:
+) -> tuple[str, Any, int | None, Any, float]:
     start = perf_counter()
     completion = client.chat.completions.create(
         model=deployment,
@@ -127,8 +128,8 @@ def run_summary_completion(
 
     summary_text = completion.choices[0].message.content if completion.choices else ""
     finish_reason = completion.choices[0].finish_reason if completion.choices else None
-    accepted_tokens = accepted_prediction_tokens(getattr(completion, "usage", None))
-    return (summary_text or ""), finish_reason, accepted_tokens, elapsed
+    usage = getattr(completion, "usage", None)
+    return (summary_text or ""), finish_reason, accepted_prediction_tokens(usage), usage, elapsed
 
 DEFAULT_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
 
@@ -228,22 +229,25 @@ def parse_args() -> argparse.Namespace:
         default=DEFAULT_PROMPT,
         help="Custom natural-language prompt for summarization.",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call Azure OpenAI instead of reusing a cached response (responses are only cached at temperature 0).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=float(os.getenv("LLMCODEGEN_CACHE_TTL", "0")),
+        help="Maximum age in seconds of a reusable cached response (0 = no expiry).",
+    )
     return parser.parse_args()
 
 
-def append_jsonl(path: Path, payload: dict[str, Any]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8") as handle:
-        handle.write(json.dumps(payload, ensure_ascii=False) + "\n")
-
-
 def iter_source_files(paths: list[str]) -> Iterator[Path]:
     for raw in paths:
         candidate = Path(raw)
         if candidate.is_dir():
-            for file_path in sorted(candidate.rglob("*")):
-                if file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                    yield file_path
+            yield from _walk_source_files(str(candidate))
         elif candidate.is_file() and candidate.suffix.lower() in SUPPORTED_EXTENSIONS:
             yield candidate
 
@@ -252,16 +256,20 @@ def gather_context(paths: list[str], budget: int) -> str:
     remaining = budget
     snippets: list[str] = []
 
-    for file_path in iter_source_files(paths):
+    # Prefixes are read on a small thread pool a few files ahead of this loop.
+    for file_path, data in iter_file_prefixes(iter_source_files(paths), max(0, budget)):
+        # Keep only what is left of the budget; len(data) is the bytes consumed,
+        # so the chunk never has to be re-encoded to charge the budget.
+        data = data[: max(0, remaining)]
         try:
-            text = file_path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            text = file_path.read_text(encoding="latin-1", errors="replace")
-
-        encoded = text.encode("utf-8")
-        chunk = encoded[:remaining].decode("utf-8", errors="ignore")
+            chunk = data.decode("utf-8")
+        except UnicodeDecodeError as exc:
+            if exc.reason == "unexpected end of data":
+                chunk = data.decode("utf-8", errors="ignore")
+            else:
+                chunk = data.decode("latin-1", errors="replace")
         snippets.append(f"// source: {file_path}\n{chunk}")
-        remaining -= len(chunk.encode("utf-8"))
+        remaining -= len(data)
         if remaining <= 0:
             break
 
@@ -297,23 +305,57 @@ def main() -> int:
     if AzureOpenAI is None:
         raise RuntimeError("The 'openai' package is required to call the Azure OpenAI API.")
 
+    # The chat call and a Responses API fallback reuse one pooled connection.
     client = AzureOpenAI(
         api_key=args.api_key,
         azure_endpoint=args.endpoint,
         api_version=args.api_version,
+        http_client=create_http_client(),
     )
     messages = build_messages(args.prompt, context)
 
     run_id = (args.run_id or "").strip() or str(uuid.uuid4())
     run_started = datetime.now(timezone.utc).isoformat()
 
-    summary_text, finish_reason, accepted_tokens, elapsed = run_summary_completion(
-        client=client,
-        deployment=args.deployment,
-        messages=messages,
-        temperature=args.temperature,
-        max_tokens=args.max_tokens,
-    )
+    # Deterministic requests over unchanged sources reuse the earlier summary.
+    cache_key: str | None = None
+    if not args.no_cache and float(args.temperature) == 0.0:
+        cache_key = response_cache_key(
+            deployment=args.deployment,
+            api_version=args.api_version,
+            messages=messages,
+            temperature=float(args.temperature),
+            max_tokens=int(args.max_tokens),
+            response_format=None,
+            n=1,
+        )
+    lookup_started = perf_counter()
+    cached = load_cached_response(cache_key, float(args.cache_ttl)) if cache_key else None
+
+    # A hit reports its own duration; the stored one is from the run that called the model.
+    cached_elapsed: float | None = None
+    if cached is not None:
+        response_cache = "hit"
+        outputs, finish_reasons, accepted_tokens, _usage, cached_elapsed = cached
+        summary_text, finish_reason = outputs[0], finish_reasons[0]
+        elapsed = perf_counter() - lookup_started
+    else:
+        response_cache = "miss" if cache_key else "off"
+        summary_text, finish_reason, accepted_tokens, usage, elapsed = run_summary_completion(
+            client=client,
+            deployment=args.deployment,
+            messages=messages,
+            temperature=args.temperature,
+            max_tokens=args.max_tokens,
+        )
+        if cache_key and summary_text.strip():
+            store_cached_response(
+                cache_key,
+                outputs=[summary_text],
+                finish_reasons=[finish_reason],
+                usage=usage,
+                elapsed=elapsed,
+            )
 
     run_finished = datetime.now(timezone.utc).isoformat()
 
@@ -347,14 +389,24 @@ def main() -> int:
         "diagnostics": {
             "deployment": args.deployment,
             "finish_reason": finish_reason,
+            "response_cache": response_cache,
             "summary_length": len((summary_text or "").strip()),
             "accepted_prediction_tokens": accepted_tokens,
+            "cached_duration_seconds": round(cached_elapsed, 3) if cached_elapsed is not None else None,
         },
     }
 
     output_path = Path(args.output).resolve()
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    if orjson is not None:
+        data = orjson.dumps(payload, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(payload, indent=2).encode("utf-8")
+    # Write a sibling temp file and rename it over the output, so an interrupted
+    # run never leaves a truncated summary for the next step to parse.
+    tmp_path = output_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, output_path)
 
     if (args.run_log or "").strip():
         run_log_path = Path(args.run_log).expanduser()
@@ -7,8 +7,11 @@ This avoids relying on the model to format a correct unified diff.
 from __future__ import annotations
 
 import argparse
+import functools
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from pathlib import Path
 from time import perf_counter
 from typing import Any
@@ -27,6 +30,15 @@ except ModuleNotFoundError:  # pragma: no cover
 import difflib
 import re
 
+# .env parsing, response cache and HTTP client are shared with generate_from_codebase.py.
+from generate_from_codebase import (  # noqa: E402
+    _load_dotenv_file,
+    create_http_client,
+    load_cached_response,
+    response_cache_key,
+    store_cached_response,
+)
+
 
 def _dotenv_candidates() -> list[Path]:
     return [
@@ -37,17 +49,9 @@ def _dotenv_candidates() -> list[Path]:
 
 def _read_dotenv_value(key: str) -> str | None:
     for env_path in _dotenv_candidates():
-        if not env_path.exists() or not env_path.is_file():
-            continue
-        for raw_line in env_path.read_text(encoding="utf-8", errors="replace").splitlines():
-            line = raw_line.strip()
-            if not line or line.startswith("#") or "=" not in line:
-                continue
-            k, v = line.split("=", 1)
-            if k.strip() != key:
-                continue
-            value = v.strip().strip('"').strip("'")
-            return value if value else None
+        values = _load_dotenv_file(env_path)
+        if key in values:
+            return values[key] or None
     return None
 
 
@@ -81,15 +85,32 @@ def normalize_azure_endpoint(raw: str) -> str:
 
 def strip_markdown_fences(text: str) -> str:
     stripped = (text or "").strip()
-    if stripped.startswith("```"):
-        lines = stripped.splitlines()
-        # drop first fence line
-        lines = lines[1:]
-        # drop last fence line if present
-        if lines and lines[-1].strip().startswith("```"):
-            lines = lines[:-1]
-        return "\n".join(lines).strip()
-    return stripped
+    if not stripped.startswith("```"):
+        return stripped
+    # drop first fence line (by slicing, not by splitting and re-joining every line)
+    first_newline = stripped.find("\n")
+    if first_newline == -1:
+        return ""
+    body = stripped[first_newline + 1 :]
+    # drop last fence line if present
+    last_newline = body.rfind("\n")
+    if body[last_newline + 1 :].strip().startswith("```"):
+        body = body[:last_newline] if last_newline != -1 else ""
+    return body.strip()
+
+
+def _output_head(text: str) -> str | None:
+    """Return the start of streamed output after any opening fence, or None if too short to tell."""
+
+    head = text.lstrip()
+    if head.startswith("```"):
+        newline = head.find("\n")
+        if newline == -1:
+            return None
+        head = head[newline + 1 :].lstrip()
+    elif "```".startswith(head):
+        return None
+    return head if len(head) >= len("<?php") else None
 
 
 def load_text(path: Path) -> str:
@@ -101,9 +122,20 @@ def load_text(path: Path) -> str:
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Ask Azure OpenAI for updated file content, then emit a patch.")
-    parser.add_argument("--target", required=True, help="Path to the file to refactor.")
+    parser.add_argument(
+        "--target",
+        nargs="+",
+        required=True,
+        help="Path to the file to refactor. Several targets are refactored concurrently into one patch.",
+    )
     parser.add_argument("--prompt", required=True, help="Path to a prompt text file.")
     parser.add_argument("--output", required=True, help="Where to write the unified diff patch.")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("LLM_CONCURRENCY", "8")),
+        help="Number of targets to send to the model at once (1 = one after another).",
+    )
     parser.add_argument("--extra-context", nargs="*", default=[], help="Optional extra context files (e.g. summaries).")
 
     parser.add_argument(
@@ -142,6 +174,17 @@ def parse_args() -> argparse.Namespace:
         default=int(os.getenv("AZURE_OPENAI_MAX_TOKENS", "6000")),
         help="Maximum tokens to request.",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call Azure OpenAI instead of reusing a cached response (responses are only cached at temperature 0).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=float(os.getenv("LLMCODEGEN_CACHE_TTL", "0")),
+        help="Maximum age in seconds of a reusable cached response (0 = no expiry).",
+    )
     return parser.parse_args()
 
 
@@ -162,7 +205,7 @@ def _validate_function_output(function_name: str, function_text: str) -> None:
         raise ModelOutputError("Model returned empty function content.")
     if "<?php" in t:
         raise ModelOutputError("Model returned a full file; expected function-only output.")
-    if re.search(rf"\bfunction\s+{re.escape(function_name)}\b", t) is None:
+    if _function_keyword_re(function_name).search(t) is None:
         raise ModelOutputError(f"Model output does not contain function '{function_name}'.")
     if "{" not in t or "}" not in t:
         raise ModelOutputError("Model function output is missing braces.")
@@ -173,23 +216,50 @@ def _extract_php_function_text(text: str, function_name: str) -> str:
     return text[start:end]
 
 
+_THIS_METHOD_CALL_RE = re.compile(r"\$this->([A-Za-z_][A-Za-z0-9_]*)\s*\(")
+
+
 def _this_method_calls(text: str) -> set[str]:
-    return set(re.findall(r"\$this->([A-Za-z_][A-Za-z0-9_]*)\s*\(", text))
+    return set(_THIS_METHOD_CALL_RE.findall(text))
+
+
+# Patterns that embed a function name are compiled once per name.
+@functools.lru_cache(maxsize=64)
+def _function_keyword_re(function_name: str) -> re.Pattern[str]:
+    return re.compile(rf"\bfunction\s+{re.escape(function_name)}\b")
 
 
+@functools.lru_cache(maxsize=64)
+def _function_header_re(function_name: str) -> re.Pattern[str]:
+    # Match at line start to avoid capturing a preceding delimiter.
+    return re.compile(
+        rf"(?im)^\s*(?:public\s+|protected\s+|private\s+)?(?:static\s+)?function\s+{re.escape(function_name)}\s*\("
+    )
+
+
+# One token per match: a '...' or "..." string (backslash escapes), a /* */ or
+# // / # comment, or a brace. Unterminated strings and block comments run to the
+# end of the text.
+_PHP_BRACE_TOKEN_RE = re.compile(
+    r"""'[^'\\]*(?:\\.?[^'\\]*)*'?|"[^"\\]*(?:\\.?[^"\\]*)*"?|/\*.*?(?:\*/|\Z)|(?://|#)[^\n]*|[{}]""",
+    re.DOTALL,
+)
+
+
+@functools.lru_cache(maxsize=32)
 def _find_php_function_span(text: str, function_name: str) -> tuple[int, int]:
     """Return (start, end) slice for a PHP function definition.
 
     Important: start must include the visibility/modifiers (e.g. `public static function ...`),
     otherwise replacing only from the `function` keyword can leave a dangling `public ` token
     in the original text.
+
+    Cached: a refactor looks the span up once to extract the function and again
+    to splice in the replacement. Python caches a string's hash, so repeated
+    lookups on the same file text cost a dict probe instead of another scan.
     """
 
-    # Match at line start to avoid capturing a preceding delimiter.
-    m = re.search(
-        rf"(?im)^\s*(?:public\s+|protected\s+|private\s+)?(?:static\s+)?function\s+{re.escape(function_name)}\s*\(",
-        text,
-    )
+    m = _function_header_re(function_name).search(text)
     if not m:
         raise ValueError(f"Could not find function '{function_name}' in target file.")
 
@@ -200,82 +270,17 @@ def _find_php_function_span(text: str, function_name: str) -> tuple[int, int]:
     if brace_open == -1:
         raise ValueError(f"Could not find opening '{{' for function '{function_name}'.")
 
-    i = brace_open
+    # Braces inside strings and comments don't count; the token regex skips
+    # those spans in C instead of walking the text character by character.
     depth = 0
-    in_sq = False
-    in_dq = False
-    in_line_comment = False
-    in_block_comment = False
-    escape = False
-
-    while i < len(text):
-        ch = text[i]
-        nxt = text[i + 1] if i + 1 < len(text) else ""
-
-        if in_line_comment:
-            if ch == "\n":
-                in_line_comment = False
-            i += 1
-            continue
-        if in_block_comment:
-            if ch == "*" and nxt == "/":
-                in_block_comment = False
-                i += 2
-                continue
-            i += 1
-            continue
-
-        if in_sq:
-            if escape:
-                escape = False
-            elif ch == "\\":
-                escape = True
-            elif ch == "'":
-                in_sq = False
-            i += 1
-            continue
-        if in_dq:
-            if escape:
-                escape = False
-            elif ch == "\\":
-                escape = True
-            elif ch == '"':
-                in_dq = False
-            i += 1
-            continue
-
-        # Start comments
-        if ch == "/" and nxt == "/":
-            in_line_comment = True
-            i += 2
-            continue
-        if ch == "#":
-            in_line_comment = True
-            i += 1
-            continue
-        if ch == "/" and nxt == "*":
-            in_block_comment = True
-            i += 2
-            continue
-
-        # Start strings
-        if ch == "'":
-            in_sq = True
-            i += 1
-            continue
-        if ch == '"':
-            in_dq = True
-            i += 1
-            continue
-
+    for token in _PHP_BRACE_TOKEN_RE.finditer(text, brace_open):
+        ch = token.group()
         if ch == "{":
             depth += 1
         elif ch == "}":
             depth -= 1
             if depth == 0:
-                return start, i + 1
-
-        i += 1
+                return start, token.end()
 
     raise ValueError(f"Could not find end of function '{function_name}' (brace mismatch).")
 
@@ -286,63 +291,27 @@ def _replace_php_function(original_text: str, function_name: str, new_function_t
     return original_text[:start] + replacement + original_text[end:]
 
 
-def main() -> int:
-    if load_dotenv is not None:
-        load_dotenv()  # pragma: no cover
-
-    prefer_deployment_from_dotenv()
-
-    args = parse_args()
-
-    if AzureOpenAI is None:
-        raise RuntimeError("The 'openai' package is required.")
+def refactor_target(
+    *,
+    call_model: Any,
+    target_path: Path,
+    suitecrm_root: Path,
+    prompt_text: str,
+    extra_context: str,
+    mode: str,
+    function_name: str,
+) -> tuple[str, str]:
+    """Ask the model to refactor one target file; return (diff text, mode used)."""
 
-    if not args.endpoint or not args.api_key or not args.deployment:
-        raise ValueError("Azure OpenAI endpoint, key, and deployment must be configured.")
-
-    endpoint = normalize_azure_endpoint(args.endpoint)
-
-    target_path = Path(args.target).resolve()
-    if not target_path.exists() or not target_path.is_file():
-        raise FileNotFoundError(f"Target file not found: {target_path}")
-
-    suitecrm_root = Path(os.getenv("SUITECRM_ROOT", "../../SuiteCRM")).resolve()
     try:
         rel_path = target_path.relative_to(suitecrm_root).as_posix()
     except Exception:
         rel_path = target_path.name
 
     original_text = load_text(target_path)
-    prompt_text = load_text(Path(args.prompt).resolve())
-
-    extra_blocks: list[str] = []
-    for raw in args.extra_context or []:
-        p = Path(raw)
-        if not p.is_absolute():
-            p = (Path.cwd() / p).resolve()
-        if not p.exists() or not p.is_file():
-            raise FileNotFoundError(f"Extra context file not found: {raw}")
-        extra_blocks.append(f"// extra-context: {p}\n{load_text(p)}")
-
-    extra_context = "\n\n".join(extra_blocks).strip()
-
-    def call_model(system: str, user: str) -> str:
-        completion = client.chat.completions.create(
-            model=args.deployment,
-            messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
-            temperature=args.temperature,
-            max_completion_tokens=args.max_tokens,
-        )
-        text = completion.choices[0].message.content if completion.choices else ""
-        return strip_markdown_fences(text)
-
-    client = AzureOpenAI(api_key=args.api_key, azure_endpoint=endpoint, api_version=args.api_version)
-
-    start = perf_counter()
 
     new_text = ""
-    mode_used = args.mode
-    function_name = (args.function_name or "").strip()
+    mode_used = mode
 
     original_function_text = ""
     if function_name:
@@ -366,7 +335,7 @@ def main() -> int:
             + original_text
             + "\n"
         )
-        return call_model(system, user)
+        return call_model(system, user, require_php_open_tag=original_text.lstrip().startswith("<?php"))
 
     def function_only_request() -> str:
         system = (
@@ -394,14 +363,14 @@ def main() -> int:
             + "Current function contents (full):\n"
             + (original_function_text if original_function_text else original_text)
         )
-        return call_model(system, user)
+        return call_model(system, user, forbid_php_open_tag=True)
 
-    if args.mode in {"full-file", "auto"}:
+    if mode in {"full-file", "auto"}:
         try:
             new_text = full_file_request()
             _validate_full_php_output(original_text, new_text, f"function {function_name}" if function_name else None)
         except ModelOutputError:
-            if args.mode == "full-file":
+            if mode == "full-file":
                 raise
             mode_used = "function"
 
@@ -424,7 +393,9 @@ def main() -> int:
 
         new_text = _replace_php_function(original_text, function_name, function_text)
 
-    elapsed = perf_counter() - start
+    if new_text == original_text:
+        # No changes; skip splitting and diffing both texts.
+        return "", mode_used
 
     original_lines = original_text.splitlines(keepends=False)
     new_lines = new_text.splitlines(keepends=False)
@@ -445,17 +416,180 @@ def main() -> int:
     else:
         diff_text = "diff --git a/{0} b/{0}\n".format(rel_path) + "\n".join(diff_lines) + "\n"
 
+    return diff_text, mode_used
+
+
+def main() -> int:
+    if load_dotenv is not None:
+        load_dotenv()  # pragma: no cover
+
+    prefer_deployment_from_dotenv()
+
+    args = parse_args()
+
+    if AzureOpenAI is None:
+        raise RuntimeError("The 'openai' package is required.")
+
+    if not args.endpoint or not args.api_key or not args.deployment:
+        raise ValueError("Azure OpenAI endpoint, key, and deployment must be configured.")
+
+    endpoint = normalize_azure_endpoint(args.endpoint)
+
+    target_paths: list[Path] = []
+    for raw in args.target:
+        target_path = Path(raw).resolve()
+        if not target_path.exists() or not target_path.is_file():
+            raise FileNotFoundError(f"Target file not found: {target_path}")
+        target_paths.append(target_path)
+
+    suitecrm_root = Path(os.getenv("SUITECRM_ROOT", "../../SuiteCRM")).resolve()
+
+    prompt_text = load_text(Path(args.prompt).resolve())
+
+    extra_paths: list[Path] = []
+    for raw in args.extra_context or []:
+        p = Path(raw)
+        if not p.is_absolute():
+            p = (Path.cwd() / p).resolve()
+        if not p.exists() or not p.is_file():
+            raise FileNotFoundError(f"Extra context file not found: {raw}")
+        extra_paths.append(p)
+
+    # File reads release the GIL, so several context files are read at once.
+    if len(extra_paths) > 1:
+        with ThreadPoolExecutor(max_workers=min(8, len(extra_paths))) as executor:
+            extra_texts = list(executor.map(load_text, extra_paths))
+    else:
+        extra_texts = [load_text(p) for p in extra_paths]
+    extra_blocks = [f"// extra-context: {p}\n{text}" for p, text in zip(extra_paths, extra_texts)]
+
+    extra_context = "\n\n".join(extra_blocks).strip()
+
+    def call_model(
+        system: str, user: str, *, require_php_open_tag: bool = False, forbid_php_open_tag: bool = False
+    ) -> str:
+        """Stream one completion and return its text without markdown fences.
+
+        The response is checked while it streams: output that the validators
+        would reject for its PHP open tag (a full-file answer without `<?php`,
+        a function answer with one) raises ModelOutputError at once instead of
+        after the whole file has been generated.
+        """
+
+        messages: list[Any] = [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+        # Rerunning the same refactor over an unchanged file reuses the earlier answer.
+        cache_key: str | None = None
+        if not args.no_cache and float(args.temperature) == 0.0:
+            cache_key = response_cache_key(
+                deployment=args.deployment,
+                api_version=args.api_version,
+                messages=messages,
+                temperature=float(args.temperature),
+                max_tokens=int(args.max_tokens),
+                response_format=None,
+                n=1,
+            )
+        cached = load_cached_response(cache_key, float(args.cache_ttl)) if cache_key else None
+        if cached is not None:
+            return strip_markdown_fences(cached[0][0])
+
+        call_start = perf_counter()
+        stream = client.chat.completions.create(
+            model=args.deployment,
+            messages=messages,
+            temperature=args.temperature,
+            max_completion_tokens=args.max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+        parts: list[str] = []
+        finish_reason: Any = None
+        usage: Any = None
+        head_checked = not require_php_open_tag
+        tail = ""
+        # Closing the stream drops the connection, so an aborted answer stops generating.
+        with closing(stream):
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                # Azure sends prompt-filter results and the trailing usage chunk with no choices.
+                for choice in chunk.choices or []:
+                    delta = getattr(choice, "delta", None)
+                    content = getattr(delta, "content", None) if delta is not None else None
+                    if content:
+                        parts.append(content)
+                        if forbid_php_open_tag and "<?php" in tail + content:
+                            raise ModelOutputError("Model returned a full file; expected function-only output.")
+                        tail = (tail + content)[-4:]
+                    if choice.finish_reason is not None:
+                        finish_reason = choice.finish_reason
+                if not head_checked:
+                    head = _output_head("".join(parts))
+                    if head is not None:
+                        head_checked = True
+                        if not head.startswith("<?php"):
+                            raise ModelOutputError("Model did not return the full PHP file (missing '<?php' header).")
+
+        text = "".join(parts)
+        if cache_key and text.strip():
+            store_cached_response(
+                cache_key,
+                outputs=[text],
+                finish_reasons=[finish_reason],
+                usage=usage,
+                elapsed=perf_counter() - call_start,
+            )
+        return strip_markdown_fences(text)
+
+    # Targets are refactored concurrently; size the keep-alive pool to match.
+    client = AzureOpenAI(
+        api_key=args.api_key,
+        azure_endpoint=endpoint,
+        api_version=args.api_version,
+        http_client=create_http_client(max_connections=max(10, int(args.concurrency))),
+    )
+
+    start = perf_counter()
+
+    def refactor_one(target_path: Path) -> tuple[str, str]:
+        return refactor_target(
+            call_model=call_model,
+            target_path=target_path,
+            suitecrm_root=suitecrm_root,
+            prompt_text=prompt_text,
+            extra_context=extra_context,
+            mode=args.mode,
+            function_name=(args.function_name or "").strip(),
+        )
+
+    # Each target is an independent model call that mostly waits on the network,
+    # so several targets run at once on the shared client; the patch keeps target order.
+    workers = min(max(1, int(args.concurrency)), len(target_paths))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(refactor_one, target_paths))
+    else:
+        results = [refactor_one(target_path) for target_path in target_paths]
+
+    elapsed = perf_counter() - start
+
+    diff_text = "".join(diff for diff, _ in results)
+
     out_path = Path(args.output)
     if not out_path.is_absolute():
         out_path = (Path.cwd() / out_path).resolve()
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    # Write patches with LF newlines so `git apply` works reliably regardless
-    # of Windows default CRLF translation.
-    with out_path.open("w", encoding="utf-8", newline="\n") as f:
-        f.write(diff_text)
+    # Write patches as bytes (LF newlines, so `git apply` works reliably regardless
+    # of Windows default CRLF translation) to a sibling temp file, then rename it
+    # over the output so an interrupted run never leaves a truncated patch.
+    tmp_path = out_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(diff_text.encode("utf-8"))
+    os.replace(tmp_path, out_path)
 
     print(f"Patch written to {out_path}")
-    print(f"Mode used: {mode_used}")
+    print(f"Mode used: {', '.join(mode_used for _, mode_used in results)}")
     print(f"Execution time: {elapsed:.2f}s")
     return 0
 
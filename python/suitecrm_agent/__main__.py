@@ -3,13 +3,20 @@
 from __future__ import annotations
 
 import argparse
+import functools
 import json
+import re
 from pathlib import Path
 from typing import Any
 import os
 
 import yaml
 
+try:  # pragma: no cover - libyaml bindings are optional
+    from yaml import CSafeLoader as _YamlSafeLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as _YamlSafeLoader  # type: ignore[assignment]
+
 try:  # pragma: no cover - optional dependency
     from dotenv import load_dotenv
 except ModuleNotFoundError:  # pragma: no cover
@@ -21,23 +28,44 @@ from .models import AgentTask
 from .utils import console
 
 
+# KEY=value, KEY="value" or KEY='value', with an optional trailing # comment. In an
+# unquoted value '#' only starts a comment after whitespace, so KEY=abc#def keeps abc#def.
+_ENV_LINE_RE = re.compile(
+    r"""^\s*([A-Za-z_][A-Za-z0-9_]*)\s*=\s*"""
+    r"""(?:"([^"]*)"\s*(?:#.*)?|'([^']*)'\s*(?:#.*)?|((?:\S(?:.*?\S)??)?)(?:\s+#.*)?\s*)$"""
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_dotenv_file(env_path: Path) -> dict[str, str]:
+    """Parse a .env file once; later lookups reuse the cached mapping.
+
+    A missing file is cached as an empty mapping. The first assignment of a key
+    wins, matching the line-by-line lookups this replaces.
+    """
+
+    values: dict[str, str] = {}
+    if not env_path.exists() or not env_path.is_file():
+        return values
+    # Lines are streamed from a buffered handle instead of reading and splitting the whole file.
+    with env_path.open("r", encoding="utf-8", errors="replace", buffering=1 << 16) as handle:
+        for line in handle:
+            m = _ENV_LINE_RE.match(line)
+            if m:
+                key, double, single, bare = m.groups()
+                values.setdefault(key, double if double is not None else single if single is not None else bare)
+    return values
+
+
 def _read_dotenv_value(key: str) -> str | None:
     candidates = [
         Path(__file__).resolve().parents[2] / ".env",  # LLMCodeGenerator/.env
         Path(__file__).resolve().parents[3] / ".env",  # repo root .env (if present)
     ]
     for env_path in candidates:
-        if not env_path.exists() or not env_path.is_file():
-            continue
-        for raw_line in env_path.read_text(encoding="utf-8", errors="replace").splitlines():
-            line = raw_line.strip()
-            if not line or line.startswith("#") or "=" not in line:
-                continue
-            k, v = line.split("=", 1)
-            if k.strip() != key:
-                continue
-            value = v.strip().strip('"').strip("'")
-            return value if value else None
+        values = _load_dotenv_file(env_path)
+        if key in values:
+            return values[key] or None
     return None
 
 
@@ -72,7 +100,7 @@ def load_payload(path: str) -> dict[str, Any]:
 
     text = file_path.read_text(encoding="utf-8")
     if file_path.suffix.lower() in {".yaml", ".yml"}:
-        return yaml.safe_load(text)
+        return yaml.load(text, Loader=_YamlSafeLoader)
     return json.loads(text)
 
 
@@ -101,7 +129,8 @@ def main() -> int:
     result = agent.run_task(task)
 
     output_path = Path(args.output).resolve()
-    output_path.write_text(json.dumps(result.to_dict(), indent=2), encoding="utf-8")
+    with output_path.open("w", encoding="utf-8", buffering=1 << 16) as handle:
+        json.dump(result.to_dict(), handle, indent=2)
     console().print(f"[bold blue]Agent output written to {output_path}[/bold blue]")
     return 0
 
@@ -3,6 +3,8 @@
 from __future__ import annotations
 
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Iterable
 from time import perf_counter
@@ -17,7 +19,7 @@ from .config import AgentConfig
 from .models import AgentResult, AgentTask, ModuleSummary
 from .store import SummaryStore
 from .summarizer import AutoSummarizer
-from .utils import append_jsonl, chunk_text, console, environment_summary, read_text_safe, utc_now_iso
+from .utils import append_jsonl, console, environment_summary, read_text_head, utc_now_iso
 
 
 class SuiteCRMAgent:
@@ -34,7 +36,13 @@ class SuiteCRMAgent:
         started = perf_counter()
         indexed_modules = list(self._collect_modules(task))
         summary_start = perf_counter()
-        summaries = [self._ensure_summary(module) for module in indexed_modules]
+        if len(indexed_modules) > 1:
+            # Summarization is dominated by Azure OpenAI round-trips, so threads overlap them;
+            # ``map`` keeps summaries in module order.
+            with ThreadPoolExecutor(max_workers=min(8, len(indexed_modules))) as executor:
+                summaries = list(executor.map(self._ensure_summary, indexed_modules))
+        else:
+            summaries = [self._ensure_summary(module) for module in indexed_modules]
         summary_elapsed = perf_counter() - summary_start
 
         generation_start = perf_counter()
@@ -82,27 +90,27 @@ class SuiteCRMAgent:
         )
 
     def _collect_modules(self, task: AgentTask) -> Iterable[IndexedModule]:
-        available = {module.name: module for module in discover_modules(self.suitecrm_root)}
         selected = task.target_modules or []
 
         if not selected and task.artifacts:
             # Artifact-driven tasks can skip module summarization entirely.
             return []
 
+        available = {module.name: module for module in discover_modules(self.suitecrm_root)}
         if not selected:
             # default heuristic: pick modules that match objectives keywords
             keywords = {kw.lower() for kw in task.objectives}
-            selected = [
-                name
-                for name in available
-                if any(keyword in name.lower() for keyword in keywords)
-            ]
+            if keywords:
+                # One case-insensitive alternation scans each name once instead of once per keyword.
+                pattern = re.compile("|".join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
+                selected = [name for name in available if pattern.search(name)]
             if not selected:
                 selected = list(available.keys())[:3]
 
         for name in selected:
             module = available.get(name)
             if module:
+                module.load_artifacts()
                 yield module
             else:
                 console().print(f"[yellow]Module '{name}' not found in SuiteCRM/modules.[/yellow]")
@@ -143,7 +151,7 @@ class SuiteCRMAgent:
             plan.append(f"Detected {len(custom_artifacts)} custom extension files for additional review.")
         return plan
 
-    def _resolve_task_artifact(self, artifact: str) -> Path | None:
+    def _resolve_task_artifact(self, artifact: str, cwd: Path | None = None) -> Path | None:
         candidate = Path(artifact)
 
         if candidate.is_absolute():
@@ -151,13 +159,13 @@ class SuiteCRMAgent:
         else:
             # Prefer resolving relative to the current working directory (lets tasks reference
             # artifacts outside SuiteCRM, e.g. generated summaries under python/suitecrm_agent/runs/).
-            cwd_candidate = (Path.cwd() / candidate).resolve()
-            if cwd_candidate.exists() and cwd_candidate.is_file():
-                resolved = cwd_candidate
-            else:
-                resolved = (self.suitecrm_root / candidate).resolve()
+            cwd_candidate = ((cwd or Path.cwd()) / candidate).resolve()
+            if cwd_candidate.is_file():
+                return cwd_candidate
+            resolved = (self.suitecrm_root / candidate).resolve()
 
-        if not resolved.exists() or not resolved.is_file():
+        # is_file() is False for missing paths, so no separate exists() stat is needed.
+        if not resolved.is_file():
             console().print(f"[yellow]Artifact not found or not a file: {artifact}[/yellow]")
             return None
 
@@ -167,27 +175,23 @@ class SuiteCRMAgent:
         if not task.artifacts:
             return ""
 
+        cwd = Path.cwd()
         snippets: list[str] = []
         for artifact in task.artifacts:
-            resolved = self._resolve_task_artifact(artifact)
+            resolved = self._resolve_task_artifact(artifact, cwd)
             if resolved is None:
                 continue
 
-            text = read_text_safe(resolved)
-            chunks = list(
-                chunk_text(
-                    text,
-                    self.config.project.chunk_size,
-                    self.config.project.chunk_overlap,
-                )
-            )
-            snippet = chunks[0] if chunks else text
+            # The prompt only uses the first chunk, so read just that much of the file.
+            snippet = read_text_head(resolved, self.config.project.chunk_size)
             snippets.append(f"// artifact: {resolved}\n{snippet}")
+            if len(snippets) == 6:
+                break
 
         if not snippets:
             return ""
 
-        return "\n\nTarget artifacts (excerpted):\n" + "\n\n".join(snippets[:6])
+        return "\n\nTarget artifacts (excerpted):\n" + "\n\n".join(snippets)
 
     def _generate_code(self, task: AgentTask, summaries: list[ModuleSummary]):
         if not summaries and not task.artifacts:
@@ -2,42 +2,103 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Iterable, Iterator
 
 from .models import ModuleArtifact
-from .utils import iter_source_files
 
 SUPPORTED_EXTENSIONS = (".php", ".js", ".ts", ".tpl")
 
+# Lower-cased suffix -> artifact type for module files.
+_ARTIFACT_TYPES = {ext: "template" if ext == ".tpl" else "source" for ext in SUPPORTED_EXTENSIONS}
 
-@dataclass(slots=True)
+# modules dir -> (its mtime in ns, sorted module directory paths).
+_MODULE_DIR_CACHE: dict[str, tuple[int, tuple[Path, ...]]] = {}
+
+
+@dataclass(slots=True, init=False)
 class IndexedModule:
-    """Metadata describing a SuiteCRM module directory."""
+    """Metadata describing a SuiteCRM module directory.
+
+    ``artifacts`` is always a list; when not given, the module directory is
+    scanned the first time it is read.
+    """
 
     name: str
     path: Path
-    artifacts: list[ModuleArtifact]
+    _artifacts: list[ModuleArtifact] | None = field(default=None, repr=False, compare=False)
+
+    def __init__(self, name: str, path: Path, artifacts: list[ModuleArtifact] | None = None):
+        self.name = name
+        self.path = path
+        self._artifacts = artifacts
+
+    @property
+    def artifacts(self) -> list[ModuleArtifact]:
+        return self.load_artifacts()
+
+    @artifacts.setter
+    def artifacts(self, value: list[ModuleArtifact]) -> None:
+        self._artifacts = value
+
+    def load_artifacts(self) -> list[ModuleArtifact]:
+        """Scan the module directory for source artifacts on first use."""
+
+        if self._artifacts is None:
+            self._artifacts = list(_collect_artifacts(self.path))
+        return self._artifacts
 
 
 def discover_modules(root: Path) -> Iterator[IndexedModule]:
-    """Yield high-level modules by scanning top-level directories under SuiteCRM/modules."""
+    """Yield high-level modules by scanning top-level directories under SuiteCRM/modules.
+
+    Only directory names are read here; a module's files are scanned when its
+    ``artifacts`` are first read.
+    """
 
     modules_dir = root / "modules"
-    if not modules_dir.exists():
+    try:
+        mtime_ns = modules_dir.stat().st_mtime_ns
+    except OSError:
         return iter(())
 
-    for module_path in sorted(p for p in modules_dir.iterdir() if p.is_dir()):
-        artifacts = list(_collect_artifacts(module_path))
-        yield IndexedModule(name=module_path.name, path=module_path, artifacts=artifacts)
+    # Adding, removing or renaming a module bumps the directory mtime, which misses the cache.
+    cached = _MODULE_DIR_CACHE.get(str(modules_dir))
+    if cached is not None and cached[0] == mtime_ns:
+        module_paths = cached[1]
+    else:
+        module_paths = tuple(sorted(p for p in modules_dir.iterdir() if p.is_dir()))
+        _MODULE_DIR_CACHE[str(modules_dir)] = (mtime_ns, module_paths)
+
+    # Fresh IndexedModule objects each time, so lazily loaded artifacts are never reused across calls.
+    for module_path in module_paths:
+        yield IndexedModule(name=module_path.name, path=module_path)
+
+
+def _walk_source_entries(directory: str) -> Iterator[tuple[os.DirEntry[str], str]]:
+    # Depth-first scandir walk with entries sorted per directory: same order and
+    # matches as utils.iter_source_files (sorted rglob), but file types come from
+    # the directory entries instead of a stat per path. Yields (entry, suffix).
+    try:
+        with os.scandir(directory) as entries:
+            ordered = sorted(entries, key=lambda entry: os.path.normcase(entry.name))
+    except OSError:
+        return
+
+    for entry in ordered:
+        if entry.is_dir() and not entry.is_symlink():
+            yield from _walk_source_entries(entry.path)
+            continue
+        suffix = os.path.splitext(entry.name)[1]
+        if suffix.lower() in _ARTIFACT_TYPES and entry.is_file():
+            yield entry, suffix
 
 
 def _collect_artifacts(module_path: Path) -> Iterable[ModuleArtifact]:
-    for file_path in iter_source_files(module_path, SUPPORTED_EXTENSIONS):
-        artifact_type = "template" if file_path.suffix.lower() == ".tpl" else "source"
-        language = file_path.suffix.lstrip(".") or "txt"
-        yield ModuleArtifact(path=file_path, artifact_type=artifact_type, language=language)
+    for entry, suffix in _walk_source_entries(str(module_path)):
+        yield ModuleArtifact(path=Path(entry.path), artifact_type=_ARTIFACT_TYPES[suffix.lower()], language=suffix[1:])
 
 
 def collect_custom_logic(root: Path) -> list[ModuleArtifact]:
@@ -48,12 +109,12 @@ def collect_custom_logic(root: Path) -> list[ModuleArtifact]:
         return []
 
     artifacts = []
-    for file_path in iter_source_files(custom_dir, SUPPORTED_EXTENSIONS):
+    for entry, suffix in _walk_source_entries(str(custom_dir)):
         artifacts.append(
             ModuleArtifact(
-                path=file_path,
+                path=Path(entry.path),
                 artifact_type="custom",
-                language=file_path.suffix.lstrip(".") or "txt",
+                language=suffix[1:],
             )
         )
     return artifacts
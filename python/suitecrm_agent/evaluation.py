@@ -42,5 +42,6 @@ def compare_results(baseline: AgentResult, summarization: AgentResult) -> dict[s
 
 
 def record_metrics(path: Path, metrics: EvaluationMetrics) -> None:
-    path.write_text(json.dumps(metrics.to_dict(), indent=2), encoding="utf-8")
+    with path.open("w", encoding="utf-8", buffering=1 << 16) as handle:
+        json.dump(metrics.to_dict(), handle, indent=2)
     console().print(f"[green]Evaluation metrics saved to {path}[/green]")
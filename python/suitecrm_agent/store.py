@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import json
+import threading
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterator, Sequence
@@ -34,6 +35,8 @@ class SummaryStore:
     def __init__(self, directory: Path):
         self.directory = directory
         ensure_directory(self.directory)
+        # Guards summary files and the vector store when modules are summarized concurrently.
+        self._lock = threading.Lock()
         self._client = self._init_vector_store(directory)
 
     def _init_vector_store(self, directory: Path):  # type: ignore[no-untyped-def]
@@ -56,7 +59,8 @@ class SummaryStore:
         return self.directory / f"{safe_name}.json"
 
     def load(self, module: str) -> ModuleSummary | None:
-        payload = load_json(self.summary_path(module))
+        with self._lock:
+            payload = load_json(self.summary_path(module))
         if payload is None:
             return None
         source_files = [
@@ -81,6 +85,10 @@ class SummaryStore:
         )
 
     def save(self, summary: ModuleSummary) -> None:
+        with self._lock:
+            self._save_locked(summary)
+
+    def _save_locked(self, summary: ModuleSummary) -> None:
         payload = summary.to_dict()
         if "source_hash" not in payload or not payload["source_hash"]:
             payload["source_hash"] = compute_sha256([artifact.path for artifact in summary.source_files])
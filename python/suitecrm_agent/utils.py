@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import functools
 import hashlib
 import json
 import os
@@ -55,6 +56,18 @@ def read_text_safe(path: Path) -> str:
         return path.read_text(encoding="latin-1", errors="replace")
 
 
+def read_text_head(path: Path, max_chars: int) -> str:
+    """Like ``read_text_safe`` but stops after ``max_chars`` characters (all of them if <= 0)."""
+
+    limit = max_chars if max_chars > 0 else -1
+    try:
+        with path.open("r", encoding="utf-8") as handle:
+            return handle.read(limit)
+    except UnicodeDecodeError:
+        with path.open("r", encoding="latin-1", errors="replace") as handle:
+            return handle.read(limit)
+
+
 def measure_time(func):  # type: ignore[no-untyped-def]
     """Simple decorator for measuring execution time."""
 
@@ -100,11 +113,17 @@ def iter_source_files(root: Path, patterns: Iterable[str]) -> Iterator[Path]:
             yield path
 
 
-def environment_summary() -> dict[str, str]:
+@functools.lru_cache(maxsize=1)
+def _environment_snapshot() -> tuple[tuple[str, str], ...]:
     keys = [
         "AZURE_OPENAI_ENDPOINT",
         "AZURE_OPENAI_DEPLOYMENT",
         "AZURE_OPENAI_EMBEDDING_DEPLOYMENT",
         "SUITECRM_ROOT",
     ]
-    return {key: os.getenv(key, "") for key in keys}
+    return tuple((key, os.getenv(key, "")) for key in keys)
+
+
+def environment_summary() -> dict[str, str]:
+    # Read once per process; callers get their own dict so the cached snapshot stays untouched.
+    return dict(_environment_snapshot())
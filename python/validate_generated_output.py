@@ -20,10 +20,16 @@ import subprocess
 import sys
 import tempfile
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
+try:  # pragma: no cover - optional, faster JSON encode
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover
+    orjson = None  # type: ignore
+
 
 @dataclass(frozen=True)
 class Finding:
@@ -76,9 +82,13 @@ def parse_args() -> argparse.Namespace:
 
 
 def append_jsonl(path: Path, payload: dict[str, Any]) -> None:
+    if orjson is not None:
+        line = orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS) + b"\n"
+    else:
+        line = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8") as handle:
-        handle.write(json.dumps(payload, ensure_ascii=False) + "\n")
+    with path.open("ab") as handle:
+        handle.write(line)
 
 
 def read_text(path: Path) -> str:
@@ -215,21 +225,25 @@ def validate_unified_diff(text: str) -> list[Finding]:
     return findings
 
 
+def _write_php_lint_file(text: str) -> str:
+    lint_text = text
+    if not lint_text.lstrip().startswith("<?php"):
+        lint_text = "<?php\n" + lint_text
+
+    with tempfile.NamedTemporaryFile(mode="w", encoding="utf-8", suffix=".php", delete=False) as handle:
+        handle.write(lint_text)
+        return handle.name
+
+
 def run_php_lint_if_applicable(text: str, input_path: Path, skip: bool) -> Finding | None:
     if skip:
         return None
     if not looks_like_php(text, input_path):
         return None
 
-    lint_text = text
-    if not lint_text.lstrip().startswith("<?php"):
-        lint_text = "<?php\n" + lint_text
-
     tmp_path: str | None = None
     try:
-        with tempfile.NamedTemporaryFile(mode="w", encoding="utf-8", suffix=".php", delete=False) as handle:
-            handle.write(lint_text)
-            tmp_path = handle.name
+        tmp_path = _write_php_lint_file(text)
 
         proc = subprocess.run(
             ["php", "-l", tmp_path],
@@ -263,25 +277,81 @@ def run_php_lint_if_applicable(text: str, input_path: Path, skip: bool) -> Findi
     return Finding(severity="info", code="php.lint_ok", message=output.strip() or "php -l OK")
 
 
-def validate_file(
-    input_path: Path,
-    suitecrm_root: Path,
-    *,
-    no_php_lint: bool = False,
-) -> tuple[dict[str, Any], list[Finding]]:
-    """Run offline validation for an output artifact.
+def run_php_lint_batch(items: list[tuple[str, Path]], skip: bool) -> list[Finding | None]:
+    """Lint several (text, input_path) items with as few `php -l` processes as possible.
 
-    Returns a JSON-serializable report dict plus the raw Finding list.
+    PHP 8.3+ lints every file passed to `php -l` in one process; older versions
+    only lint the first one. Results are attributed by temp file path, and any
+    item the batch did not report on is linted on its own (in parallel).
     """
 
-    text = read_text(input_path)
+    results: list[Finding | None] = [None] * len(items)
+    if skip:
+        return results
+    candidates = [i for i, (text, input_path) in enumerate(items) if looks_like_php(text, input_path)]
+    if len(candidates) < 2:
+        for i in candidates:
+            results[i] = run_php_lint_if_applicable(items[i][0], items[i][1], skip=False)
+        return results
+
+    tmp_paths: dict[int, str] = {}
+    try:
+        for i in candidates:
+            tmp_paths[i] = _write_php_lint_file(items[i][0])
+
+        proc = subprocess.run(
+            ["php", "-l", *tmp_paths.values()],
+            capture_output=True,
+            text=True,
+            timeout=30 + 2 * len(tmp_paths),
+        )
+    except FileNotFoundError:
+        missing = Finding(severity="warn", code="php.missing", message="PHP CLI not found on PATH; skipped php -l.")
+        for i in candidates:
+            results[i] = missing
+        return results
+    except subprocess.TimeoutExpired:
+        timed_out = Finding(severity="warn", code="php.lint_timeout", message="php -l timed out.")
+        for i in candidates:
+            results[i] = timed_out
+        return results
+    finally:
+        for tmp_path in tmp_paths.values():
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    output_lines = ((proc.stdout or "") + (proc.stderr or "")).splitlines()
+    unreported: list[int] = []
+    for i, tmp_path in tmp_paths.items():
+        mentions = [line for line in output_lines if tmp_path in line]
+        if any(line.startswith("No syntax errors detected") for line in mentions):
+            results[i] = Finding(severity="info", code="php.lint_ok", message="\n".join(mentions).strip())
+        elif mentions:
+            results[i] = Finding(severity="error", code="php.lint_failed", message="\n".join(mentions).strip())
+        else:
+            unreported.append(i)
+
+    if unreported:
+        with ThreadPoolExecutor(max_workers=min(len(unreported), os.cpu_count() or 1)) as executor:
+            findings = executor.map(
+                lambda i: run_php_lint_if_applicable(items[i][0], items[i][1], skip=False), unreported
+            )
+            for i, finding in zip(unreported, findings):
+                results[i] = finding
+
+    return results
 
+
+def _build_report(
+    text: str, input_path: Path, suitecrm_root: Path, lint_finding: Finding | None
+) -> tuple[dict[str, Any], list[Finding]]:
     findings = validate_text(text, suitecrm_root)
 
     if looks_like_unified_diff(text, input_path):
         findings.extend(validate_unified_diff(text))
 
-    lint_finding = run_php_lint_if_applicable(text, input_path, skip=bool(no_php_lint))
     if lint_finding:
         findings.append(lint_finding)
 
@@ -299,6 +369,63 @@ def validate_file(
     return report, findings
 
 
+def validate_file(
+    input_path: Path,
+    suitecrm_root: Path,
+    *,
+    no_php_lint: bool = False,
+) -> tuple[dict[str, Any], list[Finding]]:
+    """Run offline validation for an output artifact.
+
+    Returns a JSON-serializable report dict plus the raw Finding list.
+    """
+
+    text = read_text(input_path)
+    lint_finding = run_php_lint_if_applicable(text, input_path, skip=bool(no_php_lint))
+    return _build_report(text, input_path, suitecrm_root, lint_finding)
+
+
+def validate_files(
+    input_paths: list[Path],
+    suitecrm_root: Path,
+    *,
+    no_php_lint: bool = False,
+) -> list[tuple[dict[str, Any], list[Finding]]]:
+    """`validate_file` for several artifacts, with `php -l` batched across them.
+
+    Returns one (report, findings) pair per input path, in order.
+    """
+
+    texts = [read_text(input_path) for input_path in input_paths]
+    lint_findings = run_php_lint_batch(list(zip(texts, input_paths)), skip=bool(no_php_lint))
+    return [
+        _build_report(text, input_path, suitecrm_root, lint_finding)
+        for text, input_path, lint_finding in zip(texts, input_paths, lint_findings)
+    ]
+
+
+def validation_run_record(
+    *,
+    run_id: str,
+    input_path: Path,
+    suitecrm_root: Path,
+    report: dict[str, Any],
+    findings: list[Finding],
+) -> dict[str, Any]:
+    """Build the compact validation record written to a JSONL run log."""
+
+    return {
+        "run_id": run_id,
+        "tool": "validate_generated_output",
+        "input_path": str(input_path),
+        "output_path": str(input_path),
+        "suitecrm_root": str(suitecrm_root),
+        "passed": int((report.get("counts") or {}).get("error", 0) or 0) == 0,
+        "counts": report.get("counts", {}),
+        "finding_codes": [f.code for f in findings],
+    }
+
+
 def append_validation_run(
     *,
     run_log_path: Path,
@@ -312,16 +439,13 @@ def append_validation_run(
 
     append_jsonl(
         run_log_path,
-        {
-            "run_id": run_id,
-            "tool": "validate_generated_output",
-            "input_path": str(input_path),
-            "output_path": str(input_path),
-            "suitecrm_root": str(suitecrm_root),
-            "passed": int((report.get("counts") or {}).get("error", 0) or 0) == 0,
-            "counts": report.get("counts", {}),
-            "finding_codes": [f.code for f in findings],
-        },
+        validation_run_record(
+            run_id=run_id,
+            input_path=input_path,
+            suitecrm_root=suitecrm_root,
+            report=report,
+            findings=findings,
+        ),
     )
 
 